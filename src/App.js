@@ -1,6 +1,50 @@
 import React, { useState, useRef, useEffect } from 'react';
 import './App.css';
 
+// Identifies this browser tab to the backend so concurrent users keep separate form state.
+const SESSION_ID = window.crypto.randomUUID();
+
+// Reads a server-sent event stream from a fetch response, calling onEvent(name, data) per event.
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const rawEvent of events) {
+      let name = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) name = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) onEvent(name, JSON.parse(data));
+    }
+  }
+};
+
+const isEventStream = (response) =>
+  (response.headers.get('Content-Type') || '').startsWith('text/event-stream');
+
+// Follows a background job's events, calling onProgress(job) on each update, and returns its result.
+const waitForJob = async (jobId, onProgress) => {
+  const response = await fetch(`http://127.0.0.1:5000/jobs/${jobId}/events`);
+  if (!response.ok) throw new Error(response.statusText);
+  let finished = null;
+  await readEventStream(response, (event, data) => {
+    if (event === 'error') throw new Error(data.error);
+    if (event === 'done') finished = data;
+    else if (onProgress) onProgress(data);
+  });
+  if (!finished) throw new Error('Job status stream ended early');
+  if (finished.status === 'failed') throw new Error(finished.error);
+  return finished.result;
+};
+
 function App() {
   const [message, setMessage] = useState('');
   const [messages, setMessages] = useState([]);
@@ -10,21 +54,43 @@ function App() {
   const [language, setLanguage] = useState("english");
   const [downloadLink, setDownloadLink] = useState("");
 
+  // Appends streamed text to the most recent message in the chat window.
+  const appendToLastMessage = (text) => {
+    setMessages((prevMessages) => {
+      const nextMessages = [...prevMessages];
+      const last = nextMessages[nextMessages.length - 1];
+      nextMessages[nextMessages.length - 1] = { ...last, text: last.text + text };
+      return nextMessages;
+    });
+  };
+
   const handleSendMessage = async () => {
     if (message) {
       setMessages((prevMessages) => [...prevMessages, { text: message, type: 'user' }]);
       setMessage('');
 
       try {
-        const response = await fetch('http://127.0.0.1:5000/chat', {
+        // With async=1 the completed form is filled as a background job.
+        const response = await fetch('http://127.0.0.1:5000/chat/stream?async=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            'Session-Id': SESSION_ID,
           },
           body: JSON.stringify({ message: message, language: language }),
         });
 
-        if (response.ok) {
+        if (response.ok && isEventStream(response)) {
+          // Free chat replies arrive token by token.
+          setMessages((prevMessages) => [...prevMessages, { text: '', type: 'llm' }]);
+          await readEventStream(response, (event, data) => {
+            if (event === 'error') {
+              console.error('Error from Flask server:', data.error);
+            } else if (data.delta) {
+              appendToLastMessage(data.delta);
+            }
+          });
+        } else if (response.ok) {
           const data = await response.json();
           setMessages((prevMessages) => [
             ...prevMessages,
@@ -33,6 +99,9 @@ function App() {
 
           if (data.download_link) {
             setDownloadLink(data.download_link);
+          } else if (data.job_id) {
+            const result = await waitForJob(data.job_id);
+            setDownloadLink(result.download_link);
           }
         } else {
           console.error('Error from Flask server:', response.statusText);
@@ -54,21 +123,26 @@ function App() {
         { text: "Rephrasing your question, please wait...", type: "assistant-loading" },
       ]);
       
-      const response = await fetch("http://127.0.0.1:5000/rephrase", {
+      const response = await fetch("http://127.0.0.1:5000/rephrase/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "Session-Id": SESSION_ID,
         },
       });
       if (response.ok) {
-        const data = await response.json();
-        // Remove the temporary loading message
-        setMessages((prevMessages) => prevMessages.filter(msg => msg.type !== "assistant-loading"));
-        // Add the rephrased question to the messages
+        // Replace the temporary loading message with the explanation as it streams in
         setMessages((prevMessages) => [
-          ...prevMessages,
-          { text: data.reply, type: "assistant" },
+          ...prevMessages.filter(msg => msg.type !== "assistant-loading"),
+          { text: "", type: "assistant" },
         ]);
+        await readEventStream(response, (event, data) => {
+          if (event === "error") {
+            console.error("Error rephrasing question:", data.error);
+          } else if (data.delta) {
+            appendToLastMessage(data.delta);
+          }
+        });
       } else {
         console.error("Error rephrasing question:", response.statusText);
       }
@@ -96,15 +170,25 @@ function App() {
     formData.append("file", file);
 
     try {
-      const response = await fetch("http://127.0.0.1:5000/upload", {
+      // With async=1 the PDF is processed as a background job.
+      const response = await fetch("http://127.0.0.1:5000/upload?async=1", {
         method: "POST",
         body: formData,
         headers: {
           "Language": language,
+          "Session-Id": SESSION_ID,
         },
       });
 
-      const data = await response.json();
+      let data = await response.json();
+      if (response.status === 202) {
+        try {
+          data = await waitForJob(data.job_id, (job) => setUploadStatus(job.message || "Processing..."));
+        } catch (error) {
+          setUploadStatus(`❌ Upload failed: ${error.message}`);
+          return;
+        }
+      }
       if (response.ok) {
         setUploadStatus(`✅ File uploaded: ${file.name}`);
         setMessages((prevMessages) => [
@@ -1,19 +1,71 @@
-from llm_service import send_to_llm
+from concurrent.futures import ThreadPoolExecutor
+from cache import TieredCache, make_key
+from llm_service import default_client, send_to_llm
+from metrics import span
+import json
+import logging
+import os
+
+# Upper bound on translation calls in flight against the LLM server at once.
+TRANSLATION_MAX_WORKERS = int(os.environ.get("TRANSLATION_MAX_WORKERS", 4))
+# Number of texts packed into a single prompt; 1 sends one prompt per text.
+TRANSLATION_PACK_SIZE = int(os.environ.get("TRANSLATION_PACK_SIZE", 1))
+
+# Bump when the translation prompts change so stale cache entries are not reused.
+TRANSLATION_PROMPT_VERSION = "1"
+
+_executor = ThreadPoolExecutor(max_workers=TRANSLATION_MAX_WORKERS, thread_name_prefix="translate")
+
+translation_cache = TieredCache("translations")
+
+
+def _cache_key(text, source_language, target_language):
+    return make_key(text, source_language.lower(), target_language.lower(), TRANSLATION_PROMPT_VERSION)
+
 
 def translate_text(text, target_language):
     if target_language.lower() == "english":
         return text
 
+    key = _cache_key(text, "english", target_language)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with span("translation"):
+        translation = send_to_llm(_to_language_messages(text, target_language), shared=True, batchable=True)
+    translation_cache.set(key, translation)
+    return translation
+
+
+async def atranslate_text(text, target_language):
+    """
+    Async variant of translate_text for the ASGI app, sharing its cache.
+    """
+    if target_language.lower() == "english":
+        return text
+
+    key = _cache_key(text, "english", target_language)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with span("translation"):
+        translation = await default_client.acomplete(_to_language_messages(text, target_language), shared=True, batchable=True)
+    translation_cache.set(key, translation)
+    return translation
+
+
+def _to_language_messages(text, target_language):
     prompt = (
         f"You are a professional translator. Please translate the following text into {target_language} accurately, "
         "preserving the original tone, context, and formatting. Do not translate proper names, numerical values, or locations. "
         "Return only the translated text with no extra commentary or explanations.\n\n"
         f"Text: {text}"
     )
-    messages = [{"role": "user", "content": prompt}]
-    return send_to_llm(messages)
+    return [{"role": "user", "content": prompt}]
 
-def translate_to_english(text):
+def _to_english_messages(text):
     prompt = (
         "You are a professional translator. Please translate the following text into English accurately, "
         "preserving the original tone, context, and formatting. If the text is already in English or does not require translation "
@@ -21,5 +73,97 @@ def translate_to_english(text):
         "Return only the translated text without any extra commentary or explanations.\n\n"
         f"Text: {text}"
     )
+    return [{"role": "user", "content": prompt}]
+
+
+def translate_to_english(text):
+    key = _cache_key(text, "auto", "english")
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with span("translation"):
+        translation = send_to_llm(_to_english_messages(text), shared=True)
+    # Answers are user data, so they are only cached in memory, not on disk.
+    translation_cache.set(key, translation, persist=False)
+    return translation
+
+
+async def atranslate_to_english(text):
+    """
+    Async variant of translate_to_english for the ASGI app; it shares the
+    translation cache, so a later translate_to_english of the same text is
+    a cache hit.
+    """
+    key = _cache_key(text, "auto", "english")
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with span("translation"):
+        translation = await default_client.acomplete(_to_english_messages(text), shared=True)
+    translation_cache.set(key, translation, persist=False)
+    return translation
+
+
+def translate_packed(texts, target_language):
+    """
+    Translate several texts with a single prompt by sending them as a JSON
+    array. Falls back to one call per text if the reply cannot be matched
+    back up with the input.
+    """
+    if target_language.lower() == "english":
+        return list(texts)
+
+    results = [translation_cache.get(_cache_key(text, "english", target_language)) for text in texts]
+    missing = [i for i, translation in enumerate(results) if translation is None]
+    if len(missing) <= 1:
+        for i in missing:
+            results[i] = translate_text(texts[i], target_language)
+        return results
+
+    texts_to_translate = [texts[i] for i in missing]
+    prompt = (
+        f"You are a professional translator. Translate each string in the following JSON array into {target_language} accurately, "
+        "preserving the original tone, context, and formatting. Do not translate proper names, numerical values, or locations. "
+        "Return only a JSON array of the translated strings, in the same order and with the same number of items, "
+        "with no extra commentary or explanations.\n\n"
+        f"Texts: {json.dumps(texts_to_translate, ensure_ascii=False)}"
+    )
     messages = [{"role": "user", "content": prompt}]
-    return send_to_llm(messages)
+    with span("translation"):
+        response = send_to_llm(messages, shared=True)
+    try:
+        translations = json.loads(response)
+    except json.JSONDecodeError:
+        translations = None
+    if isinstance(translations, list) and len(translations) == len(missing):
+        for i, translation in zip(missing, translations):
+            results[i] = str(translation)
+            translation_cache.set(_cache_key(texts[i], "english", target_language), results[i])
+        return results
+
+    logging.warning(f"Packed translation of {len(missing)} texts could not be parsed; translating individually")
+    for i in missing:
+        results[i] = translate_text(texts[i], target_language)
+    return results
+
+
+def translate_in_background(texts, target_language, callback, pack_size=None):
+    """
+    Schedule translation of texts on the shared translation pool and return
+    the futures. callback(index, translation) is invoked from a worker thread
+    as each text finishes, so callers can publish results incrementally.
+    """
+    pack_size = max(1, pack_size or TRANSLATION_PACK_SIZE)
+
+    def run(start, chunk):
+        translations = translate_packed(chunk, target_language)
+        for offset, translation in enumerate(translations):
+            callback(start + offset, translation)
+        return translations
+
+    return [
+        _executor.submit(run, start, texts[start:start + pack_size])
+        for start in range(0, len(texts), pack_size)
+    ]
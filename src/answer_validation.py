@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from llm_service import send_to_llm, LLMError
+from metrics import span
+from Translation_service import translate_text
+import json
+import logging
+import os
+import re
+import threading
+
+ANSWER_VALIDATION = os.environ.get("ANSWER_VALIDATION", "true").lower() in ("1", "true", "yes")
+# Answers the local checks cannot judge are scored by the LLM; below this
+# confidence they are re-asked at the end of the form.
+VALIDATION_MIN_CONFIDENCE = float(os.environ.get("VALIDATION_MIN_CONFIDENCE", 0.9))
+VALIDATION_USE_LLM = os.environ.get("VALIDATION_USE_LLM", "true").lower() in ("1", "true", "yes")
+VALIDATION_WORKERS = int(os.environ.get("VALIDATION_WORKERS", 2))
+# Validations queued or running at once; answers given beyond this are not
+# checked rather than queueing behind a slow LLM.
+VALIDATION_QUEUE = int(os.environ.get("VALIDATION_QUEUE", 64))
+# How long the last turn of a form waits for validations still running.
+VALIDATION_WAIT_SECONDS = float(os.environ.get("VALIDATION_WAIT_SECONDS", 10))
+# Forms whose validations are tracked at once; the oldest are dropped.
+VALIDATION_MAX_FORMS = int(os.environ.get("VALIDATION_MAX_FORMS", 1000))
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+MONTH_PATTERN = re.compile(r"jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec", re.I)
+NUMBER_PATTERN = re.compile(r"^[-+]?[£$€]?\s*\d[\d,\s]*(\.\d+)?\s*%?$")
+DATE_FORMATS = (
+    "%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y",
+    "%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y",
+)
+
+# Checked in order, so "phone number" is a phone and not a number.
+_KINDS = (
+    ("email", re.compile(r"e-?mail", re.I)),
+    ("date", re.compile(r"\bdate\b|\bbirthday\b|\bd\.?o\.?b\b", re.I)),
+    ("phone", re.compile(r"\b(tele)?phone\b|\bmobile\b", re.I)),
+    ("number", re.compile(r"\bnumber of\b|\bhow (many|much)\b|\bincome\b|\bsalary\b|\bamount\b|\bage\b", re.I)),
+)
+
+_HINTS = {
+    "email": "an email address such as name@example.com",
+    "date": "a date such as 31/12/1990",
+    "phone": "a phone number including the area code",
+}
+
+_executor = ThreadPoolExecutor(max_workers=VALIDATION_WORKERS, thread_name_prefix="validate")
+# (session_id, upload_id) -> {question index: (answer, future)}
+_pending = OrderedDict()
+_pending_lock = threading.Lock()
+_queued = 0
+
+
+def answer_kind(question):
+    for kind, pattern in _KINDS:
+        if pattern.search(question):
+            return kind
+    return None
+
+
+def _is_date(answer):
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.strptime(answer, fmt)
+            return True
+        except ValueError:
+            pass
+    return False
+
+
+def local_check(kind, answer):
+    """
+    Cheap check of an answer of a known kind: True if it is well formed,
+    False if it clearly is not, None if the LLM has to judge it.
+    """
+    answer = answer.strip()
+    has_digits = any(c.isdigit() for c in answer)
+    if kind == "email":
+        if EMAIL_PATTERN.match(answer):
+            return True
+        return False if "@" not in answer else None
+    if kind == "date":
+        if _is_date(answer):
+            return True
+        return False if not has_digits and not MONTH_PATTERN.search(answer) else None
+    if kind == "phone":
+        digits = re.sub(r"[\s()+\-.]", "", answer)
+        if digits.isdigit() and 7 <= len(digits) <= 15:
+            return True
+        return False if not has_digits else None
+    if kind == "number":
+        return True if NUMBER_PATTERN.match(answer) else None
+    return None
+
+
+def build_evaluation_messages(question, answer):
+    prompt = (
+        "Evaluate the following answer to a question on a form. Reply with only a JSON object with two keys: "
+        "\"confidence\", a number between 0 and 1 for how likely it is that the answer correctly and completely answers the question, "
+        "and \"reworded_question\", a clearer or more specific wording of the question to ask the user again if the confidence is low.\n\n"
+        f"Question: {question}\nAnswer: {answer}"
+    )
+    return [{"role": "user", "content": prompt}]
+
+
+def llm_check(question, answer):
+    """
+    Returns (confidence, reworded_question) from the LLM. Replies that
+    cannot be parsed count as confident so the user is never held up.
+    """
+    response = send_to_llm(build_evaluation_messages(question, answer), temperature=0)
+    try:
+        evaluation = json.loads(response)
+        return float(evaluation.get("confidence", 1)), evaluation.get("reworded_question") or question
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        logging.warning(f"Invalid JSON response from LLM when validating an answer: {response}")
+        return 1.0, question
+
+
+def validate_answer(question, answer, language):
+    """
+    Returns the question to ask again, in the user's language, or None if
+    the answer looks fine.
+    """
+    try:
+        with span("answer_validation"):
+            kind = answer_kind(question)
+            verdict = local_check(kind, answer)
+            if verdict is True:
+                return None
+            if verdict is False:
+                reask = f"{question} (please give {_HINTS[kind]})"
+            elif not VALIDATION_USE_LLM:
+                return None
+            else:
+                confidence, reask = llm_check(question, answer)
+                if confidence >= VALIDATION_MIN_CONFIDENCE:
+                    return None
+            return translate_text(reask, language)
+    except LLMError as e:
+        logging.warning(f"Could not validate answer: {e}")
+        return None
+
+
+def validate_in_background(session_id, upload_id, index, question, answer, language):
+    """
+    Starts validating the answer to question index on the validation pool,
+    so the next question can be shown straight away. Returns the validation
+    already started if this answer is being checked, and None if the queue
+    is full.
+    """
+    global _queued
+    if not ANSWER_VALIDATION:
+        return None
+    key = (session_id, upload_id)
+    with _pending_lock:
+        started = _pending.get(key, {}).get(index)
+        if started is not None and started[0] == answer:
+            return started[1]
+        if _queued >= VALIDATION_QUEUE:
+            return None
+        _queued += 1
+        future = _executor.submit(validate_answer, question, answer, language)
+        _pending.setdefault(key, {})[index] = (answer, future)
+        _pending.move_to_end(key)
+        while len(_pending) > VALIDATION_MAX_FORMS:
+            _pending.popitem(last=False)
+    future.add_done_callback(_release)
+    return future
+
+
+def _release(future):
+    global _queued
+    with _pending_lock:
+        _queued -= 1
+
+
+def pending_validations(session_id, upload_id):
+    """
+    Returns the futures of the form's validations, finished or not.
+    """
+    with _pending_lock:
+        return [future for _, future in _pending.get((session_id, upload_id), {}).values()]
+
+
+def wait_for_validations(session_id, upload_id, timeout=VALIDATION_WAIT_SECONDS):
+    """
+    Waits up to timeout for the form's validations to finish. Call it
+    before taking the session lock, so other requests are not held up.
+    """
+    wait(pending_validations(session_id, upload_id), timeout=timeout)
+
+
+def collect_flagged(session_id, upload_id, answers):
+    """
+    Returns the answers to re-ask as [{"index", "question"}] in question
+    order, without waiting. Answers changed since they were validated, and
+    validations still running, are skipped.
+    """
+    with _pending_lock:
+        form = _pending.pop((session_id, upload_id), {})
+
+    review_queue = []
+    for index in sorted(form):
+        answer, future = form[index]
+        if not future.done() or future.exception() is not None:
+            continue
+        if index < len(answers) and answers[index] == answer and future.result() is not None:
+            review_queue.append({"index": index, "question": future.result()})
+    return review_queue
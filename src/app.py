@@ -1,15 +1,25 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
-from conversation_state import conversation_state
-from llm_service import send_to_llm
-from Translation_service import translate_text, translate_to_english
+from conversation_state import session_state
+from context_window import build_context, compact_history
+from llm_service import send_to_llm, stream_from_llm, LLMError
+from Translation_service import translate_text, translate_to_english, translate_in_background
 from utils.pdf_processor import extract_form_fields_from_pdf
-from file_download import generate_qa_file
-from PyPDF2 import PdfReader, PdfWriter
+from file_download import EXPORT_MIMETYPES, TEMP_DIR, generate_qa_file, is_artifact, iter_qa_export, start_janitor
+from jobs import jobs, is_finished
+from batch_fill import answers_format, fill_batch, read_answer_rows, translate_rows, write_zip
+from metrics import REQUEST_SECONDS, record_stage, render_prometheus, span
+from answer_validation import collect_flagged, validate_in_background, wait_for_validations
+from rephrase_prefetch import build_rephrase_messages, cached_rephrasing, get_rephrasing, prefetch_upcoming, store_rephrasing
+from utils.pdf_filler import load_template, pdf_content_hash, template_from_bytes
+from io import BytesIO
+from werkzeug.utils import secure_filename
 import os
 import re
+import json
+import uuid
 import logging
-import time  # Add this import for timing
+import time
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,6 +33,34 @@ flask_logger.setLevel(logging.INFO)
 app = Flask(__name__)
 CORS(app)
 
+# Keep temp/ from growing without bound under load.
+start_janitor()
+
+# How often /jobs/<id>/events checks the job table for changes.
+JOB_EVENTS_POLL_SECONDS = 0.25
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    # Streaming responses are timed until their headers are sent.
+    if "request_start" in g and request.endpoint != "metrics":
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint or "unknown")
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Timing histograms, token and cache counters for this worker process in
+    the Prometheus text format.
+    """
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 
 def extract_question_number(question):
     """
@@ -35,12 +73,231 @@ def extract_question_number(question):
         return int(match.group(1))
     return float('inf')
 
+
+def get_session_id():
+    """
+    Each browser tab sends its own Session-Id header; clients that do not
+    send one share a single default session.
+    """
+    return request.headers.get("Session-Id") or "default"
+
+
+def get_question(conversation_state, index):
+    """
+    Returns the question shown to the user at index. Questions still being
+    translated in the background are translated inline instead of waiting.
+    """
+    question = conversation_state["questions"][index]
+    if question is None:
+        question = translate_text(conversation_state["original_questions"][index], conversation_state["language"])
+        conversation_state["questions"][index] = question
+    return question
+
+
+def sse_event(data, event=None):
+    """
+    Formats one server-sent event carrying a JSON payload.
+    """
+    lines = f"event: {event}\n" if event else ""
+    return lines + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        # Stop proxies from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def stream_llm_reply(messages, on_complete):
+    """
+    Relays LLM tokens as "delta" events and finishes with a "done" event
+    carrying the full reply, after on_complete(reply) has stored it.
+    """
+    parts = []
+    try:
+        for delta in stream_from_llm(messages):
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+    except LLMError as e:
+        logging.error(f"Error streaming from LLM: {e}")
+        yield sse_event({"error": "Failed to get a response from the language model."}, event="error")
+        return
+    reply = "".join(parts)
+    on_complete(reply)
+    yield sse_event({"reply": reply}, event="done")
+
+
+def store_translated_question(session_id, upload_id, index, translation):
+    with session_state(session_id) as conversation_state:
+        # Ignore results for a form the session has since replaced.
+        if conversation_state.get("upload_id") == upload_id and conversation_state["questions"][index] is None:
+            conversation_state["questions"][index] = translation
+
+
+def begin_turn(session_id, user_message):
+    """
+    Returns the LLM context for a free chat turn, or None in question mode.
+    """
+    with session_state(session_id) as conversation_state:
+        if conversation_state["in_question_mode"]:
+            return None
+        return build_context(conversation_state, [{"role": "user", "content": user_message}])
+
+
+def append_exchange(session_id, user_message, reply):
+    with session_state(session_id) as conversation_state:
+        conversation_state["conversation_history"].append({"role": "user", "content": user_message})
+        conversation_state["conversation_history"].append({"role": "assistant", "content": reply})
+        compact_history(session_id, conversation_state)
+
+
+def form_turn_targets(session_id):
+    """
+    Returns what warming up the next form turn involves: whether an answer
+    is awaited, the next question if it still needs translating, and the
+    question whose answer completes the form, if this is the last one.
+    """
+    with session_state(session_id) as conversation_state:
+        awaiting_answer = conversation_state["awaiting_answer"]
+        index = conversation_state["current_question_index"]
+        next_question = None
+        if index < len(conversation_state["questions"]) and conversation_state["questions"][index] is None:
+            next_question = conversation_state["original_questions"][index]
+        last_question = None
+        if awaiting_answer and index > 0 and index >= len(conversation_state["questions"]) and not conversation_state.get("review_queue"):
+            last_question = conversation_state["original_questions"][index - 1]
+        return {
+            "awaiting_answer": awaiting_answer,
+            "index": index - 1,
+            "next_question": next_question,
+            "last_question": last_question,
+            "language": conversation_state["language"],
+            "upload_id": conversation_state.get("upload_id"),
+        }
+
+
+def validate_last_answer(session_id, targets, translated_answer):
+    """
+    Starts validating the answer that completes the form; the turn finds it
+    already started and does not repeat it.
+    """
+    validate_in_background(
+        session_id, targets["upload_id"], targets["index"], targets["last_question"], translated_answer, targets["language"]
+    )
+
+
+def warm_form_turn(session_id, user_message, language):
+    """
+    Translates the answer and, if the background pool has not got to it yet,
+    the next question before the form turn takes the session lock, so the
+    turn finds both in the translation cache. Before the last answer of a
+    form, also waits for the form's validations, so the turn can offer the
+    re-asks without waiting under the lock.
+    """
+    targets = form_turn_targets(session_id)
+    try:
+        translated_answer = user_message
+        if targets["awaiting_answer"] and user_message and language.lower() != "english":
+            translated_answer = translate_to_english(user_message)
+        if targets["next_question"] is not None:
+            translate_text(targets["next_question"], targets["language"])
+    except LLMError as e:
+        # The turn retries and reports the error itself.
+        logging.warning(f"Could not translate ahead of the form turn: {e}")
+        return
+    if targets["last_question"] is not None and user_message:
+        validate_last_answer(session_id, targets, translated_answer)
+        wait_for_validations(session_id, targets["upload_id"])
+
+
+def form_turn(session_id, user_message, language, run_async=False, warm=True):
+    """
+    Handles a message in question mode. Callers that have already warmed
+    the turn up themselves, like the ASGI app, pass warm=False.
+    """
+    if warm:
+        warm_form_turn(session_id, user_message, language)
+    with session_state(session_id) as conversation_state:
+        response = _chat_or_error(session_id, conversation_state, user_message, language, run_async)
+        compact_history(session_id, conversation_state)
+    return finish_turn(response)
+
+
+def finish_turn(response):
+    """
+    Fills the PDF a completed form turn left in g.pending_fill, or queues
+    the fill job it left in g.pending_job, now that the session lock has
+    been released.
+    """
+    pending_job = g.pop("pending_job", None)
+    if pending_job is not None:
+        job_id, *args = pending_job
+        jobs.submit("fill", fill_job, *args, job_id=job_id)
+    pending_fill = g.pop("pending_fill", None)
+    if pending_fill is None:
+        return response
+    try:
+        populate_pdf_form(*pending_fill)
+    except Exception as e:
+        logging.error(f"Error populating PDF: {e}")
+        return jsonify({"error": "Error populating PDF form"}), 500
+    return response
+
+
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.json
     user_message = data.get("message", "")
     language = data.get("language", "english")
+    session_id = get_session_id()
+
+    messages = begin_turn(session_id, user_message)
+    if messages is None:
+        return form_turn(session_id, user_message, language, wants_async())
+
+    try:
+        # Time between user message and LLM response
+        with span("chat_reply"):
+            reply = send_to_llm(messages)
+    except LLMError as e:
+        logging.error(f"Error communicating with LLM: {e}")
+        return jsonify({"error": "Failed to get a response from the language model."}), 502
+    # Append the exchange to the conversation history only once the LLM has replied
+    append_exchange(session_id, user_message, reply)
+    return jsonify({"reply": reply})
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming variant of /chat. Free chat replies are sent as server-sent
+    events while the LLM generates them; form questions are answered with
+    the same JSON as /chat since they need no LLM call.
+    """
+    data = request.json
+    user_message = data.get("message", "")
+    language = data.get("language", "english")
+    session_id = get_session_id()
+
+    messages = begin_turn(session_id, user_message)
+    if messages is None:
+        return form_turn(session_id, user_message, language, wants_async())
+
+    return sse_response(stream_llm_reply(messages, lambda reply: append_exchange(session_id, user_message, reply)))
+
+
+def _chat_or_error(session_id, conversation_state, user_message, language, run_async=False):
+    try:
+        return _chat(session_id, conversation_state, user_message, language, run_async)
+    except LLMError as e:
+        logging.error(f"Error communicating with LLM: {e}")
+        return jsonify({"error": "Failed to get a response from the language model."}), 502
 
+
+def _chat(session_id, conversation_state, user_message, language, run_async=False):
     if not user_message and conversation_state["awaiting_answer"]:
         return jsonify({"error": "Message cannot be empty"}), 400
 
@@ -51,238 +308,346 @@ def chat():
             else:
                 translated_answer = user_message
 
-        ## Code on line 60 to 88 was generated by GitHub Copilot with the following prompt:
-        # "Add a feature that evaluates user answers to questions using the LLM. After each answer, 
-        # send the question and answer to the LLM and request a confidence score between 0 and 1. 
-        # If the score is below 0.9, re-ask the same question with a clearer or more specific wording. 
-        # Repeat this process until the LLM returns a confidence score ≥ 0.9, then store the answer and proceed to the next question."
-            """
-            # Evaluate the answer using the LLM
-            question = conversation_state["questions"][conversation_state["current_question_index"] - 1]
-            evaluation_prompt = (
-                f"Evaluate the following answer to the question and provide a confidence score between 0 and 1. "
-                f"If the confidence score is below 0.9, suggest a clearer or more specific rewording of the question.\n\n"
-                f"Question: {question}\nAnswer: {translated_answer}"
-            )
-            evaluation_messages = [{"role": "user", "content": evaluation_prompt}]
-            try:
-                evaluation_response = send_to_llm(evaluation_messages)
-                import json
-                try:
-                    evaluation_data = json.loads(evaluation_response)
-                except json.JSONDecodeError:
-                    logging.error(f"Invalid JSON response from LLM: {evaluation_response}")
-                    return jsonify({"error": "Failed to evaluate the answer due to invalid response from LLM."}), 500
-
-                confidence_score = evaluation_data.get("confidence", 0)
-                reworded_question = evaluation_data.get("reworded_question", question)
-
-                if confidence_score < 0.9:
-                    # Re-ask the question with the reworded version
-                    conversation_state["questions"][conversation_state["current_question_index"] - 1] = reworded_question
-                    conversation_state["awaiting_answer"] = True
-                    conversation_state["conversation_history"].append({"role": "assistant", "content": reworded_question})
-                    return jsonify({"reply": reworded_question})
-            except Exception as e:
-                logging.error(f"Error evaluating answer: {e}")
-                return jsonify({"error": "Failed to evaluate the answer."}), 500
-            """
-            # Update the answer for the current question (answers align with original keys)
-            index = conversation_state["current_question_index"] - 1
-            if index < len(conversation_state["answers"]):
+            review_queue = conversation_state.get("review_queue") or []
+            if review_queue:
+                # Answer to a question re-asked after validation; taken as given.
+                index = review_queue.pop(0)["index"]
                 conversation_state["answers"][index] = translated_answer
             else:
-                conversation_state["answers"].append(translated_answer)
-            
+                # Update the answer for the current question (answers align with original keys)
+                index = conversation_state["current_question_index"] - 1
+                if index < len(conversation_state["answers"]):
+                    conversation_state["answers"][index] = translated_answer
+                else:
+                    conversation_state["answers"].append(translated_answer)
+                # Checked in the background while the next question is shown.
+                validate_in_background(
+                    session_id,
+                    conversation_state.get("upload_id"),
+                    index,
+                    conversation_state["original_questions"][index],
+                    translated_answer,
+                    conversation_state["language"],
+                )
+            conversation_state["review_queue"] = review_queue
+
             conversation_state["awaiting_answer"] = False
             conversation_state["conversation_history"].append({"role": "user", "content": user_message})
 
             # If all questions have been answered, generate the filled PDF or QA file.
             if conversation_state["current_question_index"] >= len(conversation_state["questions"]):
+                # Re-ask the answers validation flagged before finishing the form.
+                if not review_queue:
+                    review_queue = collect_flagged(session_id, conversation_state.get("upload_id"), conversation_state["answers"])
+                    conversation_state["review_queue"] = review_queue
+                if review_queue:
+                    question = review_queue[0]["question"]
+                    conversation_state["awaiting_answer"] = True
+                    conversation_state["conversation_history"].append({"role": "assistant", "content": question})
+                    return jsonify({"reply": question})
+
                 # Use the original field names (keys) to populate the PDF.
                 form_data = dict(zip(conversation_state["original_questions"], conversation_state["answers"]))
 
-                if conversation_state.get("original_pdf_path"):
+                if conversation_state.get("original_pdf_path") and run_async:
+                    job_id = uuid.uuid4().hex
+                    # Submitted by finish_turn once the session lock is released.
+                    g.pending_job = (job_id, conversation_state["original_pdf_path"], form_data, conversation_state.get("original_pdf_hash"))
+                    download_link = None
+                    summary = "Your form is being filled. The download link will be available when the job finishes."
+                    extra = {"job_id": job_id, "status_url": f"/jobs/{job_id}"}
+                elif conversation_state.get("original_pdf_path"):
                     input_pdf_path = conversation_state["original_pdf_path"]
-                    output_pdf_path = os.path.join("temp", "filled_form.pdf")
-                    
-                    try:
-                        populate_pdf_form(input_pdf_path, output_pdf_path, form_data)
-                    except Exception as e:
-                        logging.error(f"Error populating PDF: {e}")
-                        return jsonify({"error": "Error populating PDF form"}), 500
-
+                    # One output per completed form so concurrent sessions never collide.
+                    output_pdf_path = os.path.join(TEMP_DIR, f"filled_form_{uuid.uuid4().hex}.pdf")
+                    # Filled by finish_turn once the session lock is released.
+                    g.pending_fill = (input_pdf_path, output_pdf_path, form_data, conversation_state.get("original_pdf_hash"))
                     download_link = f"/download/{os.path.basename(output_pdf_path)}"
                     summary = "Your form has been filled. You can download the completed PDF here: " + download_link
+                    extra = {}
                 else:
                     qa_filepath = generate_qa_file(conversation_state["original_questions"], conversation_state["answers"])
                     download_link = f"/download/{os.path.basename(qa_filepath)}"
-                    summary = "Here are the questions and answers:\n"
-                    for i, (question, answer) in enumerate(zip(conversation_state["original_questions"], conversation_state["answers"])):
-                        summary += f"{i + 1}. Q: {question}\n   A: {answer}\n"
-                    summary += f"\nYou can download the file here: {download_link}"
-
-                # Reset conversation state for a new session.
+                    qa_lines = "".join(
+                        f"{i + 1}. Q: {question}\n   A: {answer}\n"
+                        for i, (question, answer) in enumerate(zip(conversation_state["original_questions"], conversation_state["answers"]))
+                    )
+                    summary = f"Here are the questions and answers:\n{qa_lines}\nYou can download the file here: {download_link}"
+                    extra = {}
+
+                # Keep the finished form so it can still be exported, then
+                # reset conversation state for a new session.
+                conversation_state["completed_form"] = {
+                    "questions": conversation_state["original_questions"],
+                    "answers": conversation_state["answers"],
+                }
                 conversation_state["in_question_mode"] = False
                 conversation_state["original_questions"] = []
                 conversation_state["questions"] = []
                 conversation_state["current_question_index"] = 0
                 conversation_state["answers"] = []
                 conversation_state["original_pdf_path"] = ""
+                conversation_state["original_pdf_hash"] = ""
                 conversation_state["conversation_history"].append({"role": "assistant", "content": summary})
 
-                return jsonify({"reply": summary, "download_link": download_link})
+                return jsonify({"reply": summary, "download_link": download_link, **extra})
 
             # Ask the next question using the translated version.
-            question = conversation_state["questions"][conversation_state["current_question_index"]]
+            question = get_question(conversation_state, conversation_state["current_question_index"])
             conversation_state["current_question_index"] += 1
             conversation_state["awaiting_answer"] = True
             conversation_state["conversation_history"].append({"role": "assistant", "content": question})
+            prefetch_upcoming(conversation_state)
             return jsonify({"reply": question})
         else:
-            question = conversation_state["questions"][conversation_state["current_question_index"]]
+            question = get_question(conversation_state, conversation_state["current_question_index"])
             conversation_state["awaiting_answer"] = True
             conversation_state["conversation_history"].append({"role": "assistant", "content": question})
             return jsonify({"reply": question})
     else:
-        conversation_state["conversation_history"].append({"role": "user", "content": user_message})
+        user_turn = {"role": "user", "content": user_message}
         
-        # Start timing
-        start_time = time.time()
-        
-        llm_response = send_to_llm(conversation_state["conversation_history"])
-        
-        # End timing and calculate duration
-        end_time = time.time()
-        response_time = end_time - start_time
+        # Time between user message and LLM response
+        with span("chat_reply"):
+            llm_response = send_to_llm(build_context(conversation_state, [user_turn]))
         
-        # Log the response time
-        log_message = f"Time between user message and LLM response: {response_time:.2f} seconds"
-        logging.info(log_message)
-        
-        # Append the LLM response to the conversation history
+        # Append the exchange to the conversation history only once the LLM has replied
+        conversation_state["conversation_history"].append(user_turn)
         conversation_state["conversation_history"].append({"role": "assistant", "content": llm_response})
         
         # Send the response back to the frontend
         return jsonify({"reply": llm_response})  # Ensure the response is sent back to the frontend
 
 
+def wants_async():
+    """
+    Clients opt in to background processing with ?async=1 and then poll
+    /jobs/<id> for the outcome.
+    """
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
+
+
+def _no_progress(progress, message=""):
+    pass
+
+
 @app.route("/upload", methods=["POST"])
 def upload():
     if "file" not in request.files:
         return jsonify({"error": "No file provided"}), 400
 
     file = request.files["file"]
-    filename = file.filename
+    language = request.headers.get("Language", "english")
+    session_id = get_session_id()
 
+    try:
+        file_path = save_upload(file)
+    except Exception as e:
+        logging.error(f"Error saving file: {e}")
+        return jsonify({"error": "Error processing file"}), 500
+
+    if wants_async():
+        job_id = jobs.submit("upload", upload_job, session_id, file_path, language)
+        return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+    payload, status = process_upload(session_id, file_path, language)
+    return jsonify(payload), status
+
+
+def save_upload(file):
+    """
+    Saves an uploaded PDF under temp/ and returns its path, or None for
+    other file types, which carry no form fields.
+    """
+    if not file.filename.endswith(".pdf"):
+        return None
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    # Prefix uploads so sessions uploading the same file name do not collide.
+    file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+    with span("file_save"):
+        file.save(file_path)
+    return file_path
+
+
+def upload_job(report, session_id, file_path, language):
+    payload, status = process_upload(session_id, file_path, language, report)
+    if status != 200:
+        raise RuntimeError(payload["error"])
+    return payload
+
+
+def process_upload(session_id, file_path, language, report=_no_progress):
+    """
+    Extracts the questions from a saved upload, starts question mode for the
+    session and returns (payload, status) with the first question. The slow
+    extraction and translation run before the session lock is taken.
+    """
     try:
         # Start timing
-        start_time = time.time()
+        start_time = time.perf_counter()
 
-        if filename.endswith(".pdf"):
-            os.makedirs("temp", exist_ok=True)
-            file_path = os.path.join("temp", filename)
-            file.save(file_path)
-            
+        if file_path:
+            report(0.1, "Extracting form fields")
             # Extract form fields/questions from the PDF.
             with open(file_path, "rb") as f:
-                form_fields = extract_form_fields_from_pdf(f)
-            
-            conversation_state["original_pdf_path"] = file_path
-            file_content = "\n".join([f"{key}: {value}" for key, value in form_fields.items()])
+                data = f.read()
+            form_fields = extract_form_fields_from_pdf(BytesIO(data))
+            # Fills look the parsed template up by content, so the same blank
+            # form uploaded by many sessions is parsed once.
+            pdf_hash = pdf_content_hash(data)
         else:
-            file_content = file.read().decode("utf-8")
             form_fields = {}
-
-        language = request.headers.get("Language", "english")
-        conversation_state["language"] = language
+            pdf_hash = ""
 
         # Sort original questions by their Q number.
         original_questions = list(form_fields.keys())
         original_questions.sort(key=extract_question_number)
-        # Store the original keys to use when populating the PDF.
-        conversation_state["original_questions"] = original_questions
-        # Initialize answers based on the sorted original questions.
-        conversation_state["answers"] = [form_fields[q] for q in original_questions]
-
-        # Create translated questions for the user interface.
-        if language.lower() != "english":
-            translated_questions = []
-            for q in original_questions:
-                translated_questions.append(translate_text(q, language))
-            conversation_state["questions"] = translated_questions
+        if not original_questions:
+            return {"error": "No questions found in the file"}, 400
+
+        # Create translated questions for the user interface. Only the first
+        # question is translated before replying; the rest are filled in by
+        # the translation pool while the user answers.
+        translate_rest = language.lower() != "english"
+        if translate_rest:
+            report(0.6, "Translating questions")
+            questions = [translate_text(original_questions[0], language)] + [None] * (len(original_questions) - 1)
         else:
-            conversation_state["questions"] = original_questions
-
-        conversation_state["current_question_index"] = 0
-        conversation_state["file_processed"] = True
-        conversation_state["in_question_mode"] = True
-        conversation_state["awaiting_answer"] = False
-
-        if conversation_state["questions"]:
-            question = conversation_state["questions"][conversation_state["current_question_index"]]
-            conversation_state["current_question_index"] += 1
+            questions = original_questions
+
+        upload_id = uuid.uuid4().hex
+        with session_state(session_id) as conversation_state:
+            if file_path:
+                conversation_state["original_pdf_path"] = file_path
+                conversation_state["original_pdf_hash"] = pdf_hash
+            conversation_state["language"] = language
+            # Store the original keys to use when populating the PDF.
+            conversation_state["original_questions"] = original_questions
+            # Initialize answers based on the sorted original questions.
+            conversation_state["answers"] = [form_fields[q] for q in original_questions]
+            conversation_state["upload_id"] = upload_id
+            conversation_state["questions"] = questions
+            conversation_state["review_queue"] = []
+            conversation_state["file_processed"] = True
+            conversation_state["in_question_mode"] = True
+
+            question = questions[0]
+            conversation_state["current_question_index"] = 1
             conversation_state["awaiting_answer"] = True
             conversation_state["conversation_history"].append({"role": "assistant", "content": question})
-            
-            # End timing and calculate duration
-            end_time = time.time()
-            response_time = end_time - start_time
-            
-            # Log the response time
-            log_message = f"Time between file upload and first question: {response_time:.2f} seconds"
-            logging.info(log_message)
-            print(log_message)  # Ensure it is printed to the terminal
-            
-            return jsonify({"reply": question})
-        else:
-            return jsonify({"error": "No questions found in the file"}), 400
+            prefetch_upcoming(conversation_state)
+
+        if translate_rest:
+            translate_in_background(
+                original_questions[1:],
+                language,
+                lambda index, translation: store_translated_question(session_id, upload_id, index + 1, translation),
+            )
+
+        # Time between file upload and first question
+        record_stage("upload_to_first_question", time.perf_counter() - start_time)
+        return {"reply": question}, 200
 
     except Exception as e:
         logging.error(f"Error processing file: {e}")
-        return jsonify({"error": "Error processing file"}), 500
-    
+        return {"error": "Error processing file"}, 500
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-sent events with the job record each time it changes, ending
+    once the job has finished.
+    """
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        last_update = None
+        while True:
+            job = jobs.get(job_id)
+            if job is None:
+                yield sse_event({"error": "Job not found"}, event="error")
+                return
+            if job["updated"] != last_update:
+                last_update = job["updated"]
+                yield sse_event(job, event="done" if is_finished(job) else None)
+            if is_finished(job):
+                return
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return sse_response(events())
+
+
+def current_question_for_rephrase(conversation_state):
+    """
+    Returns the question currently shown to the user, or None if there is none.
+    If the current question has not yet been answered, it is at current_question_index - 1.
+    """
+    review_queue = conversation_state.get("review_queue")
+    if review_queue:
+        return review_queue[0]["question"]
+    index = conversation_state["current_question_index"] - 1
+    if index < 0 or index >= len(conversation_state["questions"]):
+        return None
+    return conversation_state["questions"][index]
+
+
+@app.route("/rephrase/stream", methods=["POST"])
+def rephrase_question_stream():
+    with session_state(get_session_id()) as conversation_state:
+        current_question = current_question_for_rephrase(conversation_state)
+        language = conversation_state["language"]
+    if current_question is None:
+        logging.error("No valid question available for rephrasing.")
+        return jsonify({"error": "No question available for rephrasing."}), 400
+
+    try:
+        rephrased_question = cached_rephrasing(current_question, language)
+    except Exception as e:
+        logging.warning(f"Prefetched rephrasing failed, generating a new one: {e}")
+        rephrased_question = None
+    if rephrased_question is not None:
+        return sse_response(iter([sse_event({"delta": rephrased_question}), sse_event({"reply": rephrased_question}, event="done")]))
+
+    return sse_response(stream_llm_reply(
+        build_rephrase_messages(current_question),
+        lambda reply: store_rephrasing(current_question, language, reply),
+    ))
+
 
 @app.route("/rephrase", methods=["POST"])
 def rephrase_question():
     # Start timing
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     # For debugging, log the current conversation state
     logging.info("Rephrase endpoint called")
-    logging.info(f"Current conversation_state: {conversation_state}")
-    
-    # Determine the index of the question to rephrase.
-    # If the current question has not yet been answered, it should be at current_question_index - 1.
-    index = conversation_state["current_question_index"] - 1
-    
-    if index < 0 or index >= len(conversation_state["questions"]):
+    with session_state(get_session_id()) as conversation_state:
+        logging.info(f"Current conversation_state: {conversation_state}")
+        # Get the question that was shown to the user
+        current_question = current_question_for_rephrase(conversation_state)
+        language = conversation_state["language"]
+
+    if current_question is None:
         logging.error("No valid question available for rephrasing.")
         return jsonify({"error": "No question available for rephrasing."}), 400
-
-    # Get the question that was shown to the user
-    current_question = conversation_state["questions"][index]
     logging.info(f"Current question to rephrase: {current_question}")
 
-    # Construct the prompt to ask the LLM to simplify and explain the question
-    prompt = (
-        "You are a helpful assistant who can simplify language. "
-        "Rephrase the following question in simpler terms and include a brief explanation of what the question is asking. "
-        "Make sure the rephrased version is clear and easy to understand for someone who might struggle with the original phrasing.\n\n"
-        f"Question: {current_question}"
-    )
-    messages = [{"role": "user", "content": prompt}]
     try:
-        rephrased_question = send_to_llm(messages)
-        
-        # End timing and calculate duration
-        end_time = time.time()
-        response_time = end_time - start_time
+        # Usually prefetched while the user was reading the question.
+        rephrased_question = get_rephrasing(current_question, language)
         
-        # Log the response time
-        log_message = f"Time between pressing 'Explain' and receiving explanation: {response_time:.2f} seconds"
-        logging.info(log_message)
-        print(log_message)  # Ensure it is printed to the terminal
+        # Time between pressing 'Explain' and receiving explanation
+        record_stage("rephrase", time.perf_counter() - start_time)
         
         logging.info(f"Rephrased question: {rephrased_question}")
         return jsonify({"reply": rephrased_question})
@@ -292,47 +657,142 @@ def rephrase_question():
 
 @app.route("/download/<filename>", methods=["GET"])
 def download_file(filename):
-    filepath = os.path.join("temp", filename)
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True)
+    filepath = os.path.join(TEMP_DIR, filename)
+    if is_artifact(filename) and os.path.isfile(filepath):
+        return send_from_directory(TEMP_DIR, filename, as_attachment=True)
     else:
         return jsonify({"error": "File not found"}), 404
+
+
+@app.route("/export", methods=["GET"])
+def export_answers():
+    """
+    Exports the session's questions and answers (the form in progress, or
+    the last completed one) as txt, csv or json. The export is streamed
+    straight into the response; with ?persist=1 it is saved under a unique
+    artifact id instead and a download link is returned.
+    """
+    fmt = request.args.get("format", "txt").lower()
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+
+    with session_state(get_session_id()) as conversation_state:
+        if conversation_state["in_question_mode"]:
+            questions = conversation_state["original_questions"]
+            answers = conversation_state["answers"]
+        else:
+            completed = conversation_state.get("completed_form") or {}
+            questions = completed.get("questions", [])
+            answers = completed.get("answers", [])
+    if not questions:
+        return jsonify({"error": "No questions to export"}), 404
+
+    if request.args.get("persist", "").lower() in ("1", "true", "yes"):
+        qa_filepath = generate_qa_file(questions, answers, fmt)
+        return jsonify({"download_link": f"/download/{os.path.basename(qa_filepath)}"})
+
+    return Response(
+        stream_with_context(iter_qa_export(questions, answers, fmt)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=answers.{fmt}"},
+    )
     
 
+@app.route("/batch_fill", methods=["POST"])
+def batch_fill():
+    """
+    Fills a template PDF once per row of a CSV or JSONL answers file and
+    returns the results as a zip. Form field translate=1 translates the
+    answers to English first; with ?async=1 the batch runs as a job whose
+    result holds the download link.
+    """
+    if "template" not in request.files or "answers" not in request.files:
+        return jsonify({"error": "A template PDF and an answers file are required"}), 400
+
+    template_bytes = request.files["template"].read()
+    try:
+        # Parsed here so a bad template is reported before any workers start.
+        template_from_bytes(template_bytes)
+    except Exception as e:
+        return jsonify({"error": f"Could not read template: {e}"}), 400
+    answers = request.files["answers"]
+    try:
+        rows = read_answer_rows(BytesIO(answers.read()), answers_format(answers.filename or ""))
+    except ValueError as e:
+        return jsonify({"error": f"Could not read answers: {e}"}), 400
+    if not rows:
+        return jsonify({"error": "The answers file has no rows"}), 400
+    translate = request.form.get("translate", "").lower() in ("1", "true", "yes")
+
+    if wants_async():
+        job_id = jobs.submit("batch_fill", batch_fill_job, template_bytes, rows, translate)
+        return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+    try:
+        if translate:
+            rows = translate_rows(rows)
+        archive = BytesIO()
+        write_zip(fill_batch(template_bytes, rows), rows, archive)
+    except Exception as e:
+        logging.error(f"Error filling batch: {e}")
+        return jsonify({"error": "Error filling batch"}), 500
+    archive.seek(0)
+    return send_file(archive, mimetype="application/zip", as_attachment=True, download_name="filled_forms.zip")
+
+
+def batch_fill_job(report, template_bytes, rows, translate):
+    if translate:
+        report(0.1, "Translating answers")
+        rows = translate_rows(rows)
+    report(0.3, f"Filling {len(rows)} forms")
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    archive_path = os.path.join(TEMP_DIR, f"batch_{uuid.uuid4().hex}.zip")
+    write_zip(fill_batch(template_bytes, rows), rows, archive_path)
+    return {"download_link": f"/download/{os.path.basename(archive_path)}"}
+
+
 @app.route("/generate_filled_pdf", methods=["POST"])
 def generate_filled_pdf():
     try:
         # Use the original field names to build form_data.
-        form_data = dict(zip(conversation_state["original_questions"], conversation_state["answers"]))
-        input_pdf_path = conversation_state.get("original_pdf_path", "path/to/original_form.pdf")
-        output_pdf_path = os.path.join("temp", "filled_form.pdf")
-        
-        populate_pdf_form(input_pdf_path, output_pdf_path, form_data)
-        return send_file(output_pdf_path, as_attachment=True)
+        with session_state(get_session_id()) as conversation_state:
+            form_data = dict(zip(conversation_state["original_questions"], conversation_state["answers"]))
+            input_pdf_path = conversation_state.get("original_pdf_path", "path/to/original_form.pdf")
+            pdf_hash = conversation_state.get("original_pdf_hash")
+
+        # Stream the filled form straight from memory instead of staging it on disk.
+        pdf_bytes = fill_pdf_form(input_pdf_path, form_data, pdf_hash)
+        return send_file(
+            BytesIO(pdf_bytes),
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name="filled_form.pdf",
+        )
     except Exception as e:
         logging.error(f"Error generating filled PDF: {e}")
         return jsonify({"error": "Error generating filled PDF"}), 500
 
 
-def populate_pdf_form(input_pdf_path, output_pdf_path, form_data):
-    try:
-        reader = PdfReader(input_pdf_path)
-        writer = PdfWriter()
-
-        for page in reader.pages:
-            writer.add_page(page)
-
-        # Update form fields on every page.
-        for page in writer.pages:
-            writer.update_page_form_field_values(page, form_data)
+def fill_job(report, input_pdf_path, form_data, pdf_hash=None):
+    output_pdf_path = os.path.join(TEMP_DIR, f"filled_form_{uuid.uuid4().hex}.pdf")
+    report(0.1, "Filling PDF form")
+    populate_pdf_form(input_pdf_path, output_pdf_path, form_data, pdf_hash)
+    return {"download_link": f"/download/{os.path.basename(output_pdf_path)}"}
 
-        with open(output_pdf_path, "wb") as output_pdf:
-            writer.write(output_pdf)
 
-        return output_pdf_path
+def fill_pdf_form(input_pdf_path, form_data, pdf_hash=None):
+    try:
+        return load_template(input_pdf_path, pdf_hash or None).fill(form_data)
     except Exception as e:
         raise RuntimeError(f"Failed to populate PDF form: {e}")
 
 
+def populate_pdf_form(input_pdf_path, output_pdf_path, form_data, pdf_hash=None):
+    pdf_bytes = fill_pdf_form(input_pdf_path, form_data, pdf_hash)
+    with open(output_pdf_path, "wb") as output_pdf:
+        output_pdf.write(pdf_bytes)
+    return output_pdf_path
+
 if __name__ == "__main__":
+    # Development server; serve asgi.py to hold many conversations waiting on the LLM.
     app.run(debug=False, port=5000)
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""
+ASGI entry point for serving many conversations from one process. The
+routes that wait on the LLM (/chat, /chat/stream, /rephrase and
+/rephrase/stream) are async and await the async LLM client, so a
+conversation waiting for a completion does not hold a thread. Session
+state and PDF work run in the thread pool, and every other route is served
+by the Flask app through a WSGI adapter.
+
+    cd src && uvicorn asgi:app --port 5000
+
+Needs starlette, uvicorn and a2wsgi. Install httpx as well, otherwise async
+LLM calls fall back to worker threads. At most LLM_ASYNC_POOL_SIZE LLM
+requests are in flight at once; the rest wait for a connection.
+"""
+from a2wsgi import WSGIMiddleware
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from answer_validation import VALIDATION_WAIT_SECONDS, pending_validations
+from app import (
+    app as flask_app, append_exchange, begin_turn, current_question_for_rephrase, form_turn, form_turn_targets, sse_event,
+    validate_last_answer,
+)
+from conversation_state import session_state
+from llm_service import default_client, LLMError
+from metrics import REQUEST_SECONDS, record_stage, span
+from rephrase_prefetch import build_rephrase_messages, cached_rephrasing, inflight_rephrasing, store_rephrasing
+from Translation_service import atranslate_text, atranslate_to_english
+import asyncio
+import functools
+import logging
+import time
+
+LLM_ERROR = {"error": "Failed to get a response from the language model."}
+
+
+def get_session_id(request):
+    return request.headers.get("Session-Id") or "default"
+
+
+def wants_async(request):
+    return request.query_params.get("async", "").lower() in ("1", "true", "yes")
+
+
+def timed(endpoint):
+    """
+    Records handler durations under the same endpoint names the Flask app uses.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        return wrapper
+    return decorator
+
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def stream_llm_reply(messages, on_complete):
+    """
+    Async counterpart of app.stream_llm_reply; on_complete(reply) is awaited
+    before the "done" event.
+    """
+    parts = []
+    try:
+        async for delta in default_client.astream(messages):
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+    except LLMError as e:
+        logging.error(f"Error streaming from LLM: {e}")
+        yield sse_event(LLM_ERROR, event="error")
+        return
+    reply = "".join(parts)
+    await on_complete(reply)
+    yield sse_event({"reply": reply}, event="done")
+
+
+def run_form_turn(session_id, user_message, language, run_async):
+    # The form flow is shared with the Flask app; its handlers build
+    # responses with jsonify, which needs an app context.
+    with flask_app.app_context():
+        response = flask_app.make_response(form_turn(session_id, user_message, language, run_async, warm=False))
+    return Response(response.get_data(), status_code=response.status_code, media_type=response.mimetype)
+
+
+async def warm_form_turn(session_id, user_message, language):
+    """
+    Async counterpart of app.warm_form_turn: the translations and the wait
+    for the form's validations are awaited, so they hold no thread.
+    """
+    targets = await run_in_threadpool(form_turn_targets, session_id)
+    translated_answer = user_message
+    if targets["awaiting_answer"] and user_message and language.lower() != "english":
+        translated_answer = await atranslate_to_english(user_message)
+    if targets["next_question"] is not None:
+        try:
+            await atranslate_text(targets["next_question"], targets["language"])
+        except LLMError as e:
+            # The turn retries and reports the error itself.
+            logging.warning(f"Could not translate ahead of the form turn: {e}")
+    if targets["last_question"] is not None and user_message:
+        validate_last_answer(session_id, targets, translated_answer)
+        futures = pending_validations(session_id, targets["upload_id"])
+        if futures:
+            await asyncio.wait([asyncio.wrap_future(future) for future in futures], timeout=VALIDATION_WAIT_SECONDS)
+
+
+async def async_form_turn(request, session_id, user_message, language):
+    try:
+        await warm_form_turn(session_id, user_message, language)
+    except LLMError as e:
+        logging.error(f"Error communicating with LLM: {e}")
+        return JSONResponse(LLM_ERROR, status_code=502)
+    return await run_in_threadpool(run_form_turn, session_id, user_message, language, wants_async(request))
+
+
+@timed("chat")
+async def chat(request):
+    data = await request.json()
+    user_message = data.get("message", "")
+    language = data.get("language", "english")
+    session_id = get_session_id(request)
+
+    messages = await run_in_threadpool(begin_turn, session_id, user_message)
+    if messages is None:
+        return await async_form_turn(request, session_id, user_message, language)
+
+    try:
+        with span("chat_reply"):
+            reply = await default_client.acomplete(messages)
+    except LLMError as e:
+        logging.error(f"Error communicating with LLM: {e}")
+        return JSONResponse(LLM_ERROR, status_code=502)
+    await run_in_threadpool(append_exchange, session_id, user_message, reply)
+    return JSONResponse({"reply": reply})
+
+
+@timed("chat_stream")
+async def chat_stream(request):
+    data = await request.json()
+    user_message = data.get("message", "")
+    language = data.get("language", "english")
+    session_id = get_session_id(request)
+
+    messages = await run_in_threadpool(begin_turn, session_id, user_message)
+    if messages is None:
+        return await async_form_turn(request, session_id, user_message, language)
+
+    async def on_complete(reply):
+        await run_in_threadpool(append_exchange, session_id, user_message, reply)
+
+    return sse_response(stream_llm_reply(messages, on_complete))
+
+
+def current_question(session_id):
+    with session_state(session_id) as conversation_state:
+        return current_question_for_rephrase(conversation_state), conversation_state["language"]
+
+
+async def ready_rephrasing(question, language):
+    """
+    Returns a prefetched rephrasing, awaiting one still being generated, or
+    None if nothing was prefetched.
+    """
+    rephrasing = await run_in_threadpool(cached_rephrasing, question, language, False)
+    if rephrasing is not None:
+        return rephrasing
+    future = inflight_rephrasing(question, language)
+    return await asyncio.wrap_future(future) if future is not None else None
+
+
+@timed("rephrase_question")
+async def rephrase_question(request):
+    start_time = time.perf_counter()
+    question, language = await run_in_threadpool(current_question, get_session_id(request))
+    if question is None:
+        logging.error("No valid question available for rephrasing.")
+        return JSONResponse({"error": "No question available for rephrasing."}, status_code=400)
+
+    try:
+        rephrasing = await ready_rephrasing(question, language)
+        if rephrasing is None:
+            rephrasing = await default_client.acomplete(build_rephrase_messages(question), shared=True, batchable=True)
+            await run_in_threadpool(store_rephrasing, question, language, rephrasing)
+    except Exception as e:
+        logging.error(f"Error in rephrase endpoint: {e}")
+        return JSONResponse({"error": "Failed to rephrase the question."}, status_code=500)
+
+    # Time between pressing 'Explain' and receiving explanation
+    record_stage("rephrase", time.perf_counter() - start_time)
+    return JSONResponse({"reply": rephrasing})
+
+
+@timed("rephrase_question_stream")
+async def rephrase_question_stream(request):
+    question, language = await run_in_threadpool(current_question, get_session_id(request))
+    if question is None:
+        logging.error("No valid question available for rephrasing.")
+        return JSONResponse({"error": "No question available for rephrasing."}, status_code=400)
+
+    try:
+        rephrasing = await ready_rephrasing(question, language)
+    except Exception as e:
+        logging.warning(f"Prefetched rephrasing failed, generating a new one: {e}")
+        rephrasing = None
+    if rephrasing is not None:
+        async def cached():
+            yield sse_event({"delta": rephrasing})
+            yield sse_event({"reply": rephrasing}, event="done")
+        return sse_response(cached())
+
+    async def on_complete(reply):
+        await run_in_threadpool(store_rephrasing, question, language, reply)
+
+    return sse_response(stream_llm_reply(build_rephrase_messages(question), on_complete))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await default_client.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Route("/rephrase", rephrase_question, methods=["POST"]),
+        Route("/rephrase/stream", rephrase_question_stream, methods=["POST"]),
+        Mount("/", WSGIMiddleware(flask_app)),
+    ],
+    # Covers the async routes; it replaces rather than duplicates the
+    # headers flask_cors sets on the mounted Flask routes.
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,168 @@
+"""
+Fill one template PDF with many rows of pre-collected answers, e.g. from a
+CRM export, without going through the question-by-question chat.
+
+    python batch_fill.py form.pdf answers.csv --out filled.zip
+    python batch_fill.py form.pdf answers.jsonl --translate --workers 8 --out filled/
+
+Each CSV column or JSONL key names a form field. An optional "_filename"
+column names the output file for that row.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import TextIOWrapper
+from metrics import record_stage
+from utils.pdf_filler import PdfTemplate
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+
+FILENAME_COLUMN = "_filename"
+BATCH_FILL_WORKERS = int(os.environ.get("BATCH_FILL_WORKERS", os.cpu_count() or 1))
+
+# Parsed once per worker process by _init_worker.
+_worker_template = None
+
+
+def read_answer_rows(stream, fmt):
+    """
+    Reads answer rows from a binary stream of CSV or JSONL.
+    """
+    text = TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        return list(csv.DictReader(text))
+    if fmt == "jsonl":
+        rows = [json.loads(line) for line in text if line.strip()]
+        for number, row in enumerate(rows, 1):
+            if not isinstance(row, dict):
+                raise ValueError(f"Row {number} is not a JSON object")
+        return rows
+    raise ValueError(f"Unsupported answers format: {fmt}")
+
+
+def answers_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def translate_rows(rows, max_workers=None):
+    """
+    Translates every distinct answer to English once, in parallel through
+    the cached translation service, and returns the translated rows.
+    """
+    # Imported here so fill-only runs and pool workers skip the LLM stack.
+    from Translation_service import TRANSLATION_MAX_WORKERS, translate_to_english
+
+    values = {str(value) for row in rows for key, value in row.items() if key != FILENAME_COLUMN and str(value).strip()}
+    with ThreadPoolExecutor(max_workers=max_workers or TRANSLATION_MAX_WORKERS) as executor:
+        translations = dict(zip(values, executor.map(translate_to_english, values)))
+    return [
+        {key: value if key == FILENAME_COLUMN else translations.get(str(value), value) for key, value in row.items()}
+        for row in rows
+    ]
+
+
+def output_name(index, row):
+    name = os.path.basename(str(row.get(FILENAME_COLUMN) or f"filled_{index + 1:05d}"))
+    return name if name.lower().endswith(".pdf") else f"{name}.pdf"
+
+
+def output_names(rows):
+    """
+    Output file names for all rows, with _2, _3, ... added to repeated names
+    so none is overwritten.
+    """
+    names = []
+    seen = set()
+    for index, row in enumerate(rows):
+        name = output_name(index, row)
+        candidate = name
+        copy = 1
+        while candidate.lower() in seen:
+            copy += 1
+            candidate = f"{name[:-4]}_{copy}.pdf"
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def _init_worker(template_bytes):
+    global _worker_template
+    _worker_template = PdfTemplate(template_bytes)
+
+
+def _fill_row(task):
+    index, row = task
+    start = time.perf_counter()
+    form_data = {key: str(value) for key, value in row.items() if key != FILENAME_COLUMN and value is not None}
+    return index, _worker_template.fill(form_data), time.perf_counter() - start
+
+
+def fill_batch(template_bytes, rows, workers=None):
+    """
+    Yields (index, pdf_bytes) for each row, filled across a process pool in
+    which every worker parses the template once.
+    """
+    workers = max(1, workers or BATCH_FILL_WORKERS)
+    # Forking the threaded server could copy a lock held by another thread
+    # into the child, so workers start from a clean forkserver process, or
+    # are spawned where there is no forkserver (Windows).
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(template_bytes,)
+    ) as executor:
+        chunksize = max(1, len(rows) // (workers * 4))
+        for index, pdf_bytes, seconds in executor.map(_fill_row, enumerate(rows), chunksize=chunksize):
+            # Metrics recorded inside the workers stay there, so the
+            # timings are sent back and recorded here.
+            record_stage("batch_fill_row", seconds)
+            yield index, pdf_bytes
+
+
+def write_zip(results, rows, out):
+    """
+    Writes the filled PDFs into a zip archive; out is a path or a binary stream.
+    """
+    names = output_names(rows)
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, pdf_bytes in results:
+            archive.writestr(names[index], pdf_bytes)
+
+
+def write_directory(results, rows, out_dir):
+    names = output_names(rows)
+    os.makedirs(out_dir, exist_ok=True)
+    for index, pdf_bytes in results:
+        with open(os.path.join(out_dir, names[index]), "wb") as f:
+            f.write(pdf_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("template", help="blank PDF form")
+    parser.add_argument("answers", help="CSV or JSONL file with one row of answers per output")
+    parser.add_argument("--out", required=True, help="a .zip file, or a directory for loose PDFs")
+    parser.add_argument("--translate", action="store_true", help="translate answers to English first")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.template, "rb") as f:
+        template_bytes = f.read()
+    with open(args.answers, "rb") as f:
+        rows = read_answer_rows(f, answers_format(args.answers))
+    if args.translate:
+        rows = translate_rows(rows)
+
+    results = fill_batch(template_bytes, rows, args.workers)
+    if args.out.lower().endswith(".zip"):
+        write_zip(results, rows, args.out)
+    else:
+        write_directory(results, rows, args.out)
+    print(f"Filled {len(rows)} forms into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
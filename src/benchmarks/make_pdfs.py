@@ -0,0 +1,131 @@
+"""
+Synthetic forms for benchmarking: AcroForm PDFs with real text fields and
+text-only PDFs whose questions have to be found in the page text. The PDFs
+are written by hand so no PDF authoring library is needed.
+
+    python -m benchmarks.make_pdfs --fields 60 --pages 3 --out form.pdf
+"""
+import argparse
+import math
+
+FIELD_LABELS = (
+    "Full name", "Date of birth", "Email address", "Phone number", "Home address",
+    "Postcode", "Nationality", "Occupation", "Employer", "Annual income",
+    "National insurance number", "Marital status", "Number of dependants", "Emergency contact",
+)
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+ROW_HEIGHT = 28
+TOP_MARGIN = 60
+
+
+def question_labels(count, numbered=True):
+    labels = []
+    for i in range(count):
+        label = FIELD_LABELS[i % len(FIELD_LABELS)]
+        if i >= len(FIELD_LABELS):
+            label = f"{label} ({i // len(FIELD_LABELS) + 1})"
+        labels.append(f"Q{i + 1} | {label}" if numbered else f"What is your {label.lower()}?")
+    return labels
+
+
+def _pdf_string(text):
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"({escaped})"
+
+
+def _serialize(objects, root):
+    """
+    objects maps object numbers to their body text; returns the PDF bytes.
+    """
+    out = bytearray(b"%PDF-1.7\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode("ascii")
+    for number in range(1, size):
+        out += f"{offsets[number]:010d} 00000 n \n".encode("ascii")
+    out += f"trailer\n<< /Size {size} /Root {root} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def make_form_pdf(fields=20, pages=1, acroform=True, numbered=True):
+    """
+    Returns a PDF with the given number of questions spread evenly over the
+    pages. With acroform each question gets a fillable text field named
+    after it; otherwise the questions only appear as page text.
+    """
+    labels = question_labels(fields, numbered)
+    per_page = max(1, math.ceil(fields / pages))
+    rows_per_page = (PAGE_HEIGHT - 2 * TOP_MARGIN) // ROW_HEIGHT
+    if per_page > rows_per_page:
+        raise ValueError(f"At most {rows_per_page} questions fit on a page; use more pages")
+
+    objects = {}
+    catalog, page_tree, font = 1, 2, 3
+    next_number = 4
+    page_numbers = []
+    field_numbers = []
+
+    objects[font] = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    for page_index in range(pages):
+        page_number, content_number = next_number, next_number + 1
+        next_number += 2
+        page_numbers.append(page_number)
+
+        page_labels = labels[page_index * per_page:(page_index + 1) * per_page]
+        lines = []
+        annots = []
+        for row, label in enumerate(page_labels):
+            y = PAGE_HEIGHT - TOP_MARGIN - row * ROW_HEIGHT
+            lines.append(f"BT /F1 10 Tf 50 {y} Td {_pdf_string(label)} Tj ET")
+            if acroform:
+                field_number = next_number
+                next_number += 1
+                field_numbers.append(field_number)
+                annots.append(f"{field_number} 0 R")
+                objects[field_number] = (
+                    f"<< /Type /Annot /Subtype /Widget /FT /Tx /T {_pdf_string(label)} /F 4 "
+                    f"/Rect [320 {y - 6} 560 {y + 14}] /P {page_number} 0 R /DA (/F1 10 Tf 0 g) >>"
+                )
+
+        stream = "\n".join(lines)
+        objects[content_number] = f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream"
+        annot_entry = f" /Annots [{' '.join(annots)}]" if annots else ""
+        objects[page_number] = (
+            f"<< /Type /Page /Parent {page_tree} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content_number} 0 R{annot_entry} >>"
+        )
+
+    kids = " ".join(f"{n} 0 R" for n in page_numbers)
+    objects[page_tree] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>"
+    acroform_entry = ""
+    if acroform:
+        fields_array = " ".join(f"{n} 0 R" for n in field_numbers)
+        acroform_entry = (
+            f" /AcroForm << /Fields [{fields_array}] /NeedAppearances true "
+            f"/DR << /Font << /F1 {font} 0 R >> >> /DA (/F1 10 Tf 0 g) >>"
+        )
+    objects[catalog] = f"<< /Type /Catalog /Pages {page_tree} 0 R{acroform_entry} >>"
+    return _serialize(objects, catalog)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--text-only", action="store_true", help="no AcroForm fields, questions as page text only")
+    parser.add_argument("--unnumbered", action="store_true", help="omit Q<n> prefixes so the LLM has to find questions")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    with open(args.out, "wb") as f:
+        f.write(make_form_pdf(args.fields, args.pages, acroform=not args.text_only, numbered=not args.unnumbered))
+
+
+if __name__ == "__main__":
+    main()
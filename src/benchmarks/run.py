@@ -0,0 +1,190 @@
+"""
+End-to-end benchmark of the form-filling backend against the stub LLM.
+
+Each simulated user uploads a synthetic form, answers every question over
+/chat and downloads the result. Latency percentiles are reported per
+endpoint (measured by the client) and per stage (from the app's own
+metrics), plus overall throughput.
+
+    cd src && python -m benchmarks.run --sessions 20 --concurrency 5 --fields 30 --pages 2
+
+Save a run with --json and pass it as --baseline to a later run to fail
+(exit status 1) when any p95 regresses by more than --tolerance.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from benchmarks.make_pdfs import make_form_pdf
+from benchmarks.stub_llm import StubLLMServer
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def timed(self, endpoint, call):
+        start = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{endpoint} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+
+def run_session(app, pdf_bytes, language, recorder):
+    client = app.test_client()
+    headers = {"Session-Id": uuid.uuid4().hex, "Language": language}
+
+    response = recorder.timed("/upload", lambda: client.post(
+        "/upload",
+        data={"file": (BytesIO(pdf_bytes), "form.pdf")},
+        headers=headers,
+        content_type="multipart/form-data",
+    ))
+    reply = response.get_json()
+    answer = 1
+    while "download_link" not in reply:
+        response = recorder.timed("/chat", lambda: client.post(
+            "/chat", json={"message": f"Answer {answer}", "language": language}, headers=headers,
+        ))
+        reply = response.get_json()
+        answer += 1
+
+    recorder.timed("/download", lambda: client.get(reply["download_link"], headers=headers))
+
+
+def summarise(samples):
+    return {
+        name: {"count": len(values), **{f"p{int(q * 100)}": percentile(values, q) for q in PERCENTILES}}
+        for name, values in sorted(samples.items())
+        if values
+    }
+
+
+def stage_summary(stage_histogram):
+    summary = {}
+    for labels in stage_histogram.label_sets():
+        quantiles = stage_histogram.quantiles(**labels)
+        summary[labels["stage"]] = {
+            "count": stage_histogram.recent_count(**labels),
+            **{f"p{int(q * 100)}": value for q, value in quantiles.items()},
+        }
+    return dict(sorted(summary.items()))
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'name':<28}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for name, row in rows.items():
+        count = row.get("count", "")
+        print(f"  {name:<28}{count:>8}{row['p50'] * 1000:>12.1f}{row['p95'] * 1000:>12.1f}{row['p99'] * 1000:>12.1f}")
+
+
+def find_regressions(report, baseline, tolerance):
+    regressions = []
+    for section in ("endpoints", "stages"):
+        for name, row in report[section].items():
+            before = baseline.get(section, {}).get(name)
+            if before and row["p95"] > before["p95"] * (1 + tolerance):
+                regressions.append(f"{section[:-1]} {name}: p95 {before['p95'] * 1000:.1f} ms -> {row['p95'] * 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="simulated users, each filling one form")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--text-only", action="store_true", help="form without AcroForm fields")
+    parser.add_argument("--unnumbered", action="store_true", help="questions without Q<n> prefixes (forces LLM extraction)")
+    parser.add_argument("--language", default="english")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub LLM seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    stub = StubLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second).start()
+    # Configure the app before importing it: settings are read at import
+    # time, and temp/ and cache/ are relative to the working directory.
+    output_path = os.path.abspath(args.json) if args.json else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.environ["LLM_API_URL"] = stub.url
+    work_dir = tempfile.mkdtemp(prefix="form-bench-")
+    os.chdir(work_dir)
+    os.environ["TEMP_DIR"] = os.path.join(work_dir, "temp")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app
+    from metrics import STAGE_SECONDS
+
+    pdf_bytes = make_form_pdf(args.fields, args.pages, acroform=not args.text_only, numbered=not args.unnumbered)
+    recorder = Recorder()
+
+    start = time.perf_counter()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(run_session, app, pdf_bytes, args.language, recorder) for _ in range(args.sessions)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failures += 1
+                print(f"Session failed: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    stub.stop()
+
+    requests_made = sum(len(values) for values in recorder.samples.values())
+    report = {
+        "config": vars(args),
+        "wall_seconds": elapsed,
+        "sessions_per_second": (args.sessions - failures) / elapsed,
+        "requests_per_second": requests_made / elapsed,
+        "failed_sessions": failures,
+        "llm_requests": stub.requests,
+        "endpoints": summarise(recorder.samples),
+        "stages": stage_summary(STAGE_SECONDS),
+    }
+
+    print(f"{args.sessions} sessions ({failures} failed) in {elapsed:.2f}s: "
+          f"{report['sessions_per_second']:.2f} sessions/s, {report['requests_per_second']:.1f} requests/s, "
+          f"{stub.requests} LLM calls")
+    print_table("Endpoints (client-side)", report["endpoints"])
+    print_table("Stages (server-side)", report["stages"])
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    status = 1 if failures else 0
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            status = 1
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
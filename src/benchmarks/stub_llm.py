@@ -0,0 +1,148 @@
+"""
+OpenAI-compatible stub of the LM Studio chat completions endpoint, with
+configurable latency and token rate, so the backend can be benchmarked
+without a model. Replies are shaped after the prompts this backend sends
+(translations, JSON question lists, rephrasings, micro-batches) so every
+code path runs.
+
+    python -m benchmarks.stub_llm --port 1234 --latency 0.2 --tokens-per-second 50
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import re
+import threading
+import time
+
+
+def stub_reply(prompt):
+    batched = re.search(r"Requests: (\[.*\])\s*$", prompt, re.S)
+    if batched:
+        return json.dumps([stub_reply(request) for request in json.loads(batched.group(1))], ensure_ascii=False)
+    packed = re.search(r"Texts: (\[.*\])\s*$", prompt, re.S)
+    if packed:
+        return json.dumps([f"~{text}" for text in json.loads(packed.group(1))], ensure_ascii=False)
+    if prompt.startswith("Extract only the questions"):
+        text = prompt.split("Text: ", 1)[-1]
+        return json.dumps([line.strip() for line in text.splitlines() if line.strip().endswith("?")])
+    if "professional translator" in prompt:
+        return "~" + prompt.rsplit("Text: ", 1)[-1]
+    if "Rephrase the following question" in prompt:
+        return "In simpler terms, this asks: " + prompt.rsplit("Question: ", 1)[-1]
+    if prompt.startswith("Evaluate"):
+        return json.dumps({"confidence": 0.95})
+    return "This is a stub reply from the benchmark language model server."
+
+
+def _tokens(text):
+    # Split roughly the way a tokenizer would, keeping the whitespace so the
+    # streamed pieces join back into the same text.
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        messages = payload.get("messages") or [{"content": ""}]
+        prompt = messages[-1].get("content") or ""
+        tokens = _tokens(stub_reply(prompt))
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(1 / server.tokens_per_second)
+                self._write_chunk(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+            return
+
+        time.sleep(len(tokens) / server.tokens_per_second)
+        body = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens)},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 makes the stub itself reset
+    # connections when many requests arrive at once.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubLLMServer:
+    """
+    Runs the stub in a background thread. requests counts the completions
+    served, which is how benchmarks check caching and deduplication.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, tokens_per_second=50.0):
+        self._server = _Server((host, port), _Handler)
+        self._server.latency = latency
+        self._server.tokens_per_second = tokens_per_second
+        self._server.requests = 0
+        self._server.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.latency, args.tokens_per_second)
+    print(f"Stub LLM listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
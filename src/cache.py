@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+CACHE_DIR = os.environ.get("CACHE_DIR", "cache")
+CACHE_MEMORY_ENTRIES = int(os.environ.get("CACHE_MEMORY_ENTRIES", 2048))
+CACHE_DISK_ENTRIES = int(os.environ.get("CACHE_DISK_ENTRIES", 100000))
+
+# How many writes happen between trims of the on-disk tier.
+_DISK_TRIM_INTERVAL = 100
+
+
+class SqliteConnections:
+    """
+    Hands each thread its own connection to the SQLite file at path, in WAL
+    mode so readers in any thread or process do not block the writer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+
+def make_key(*parts):
+    """
+    Content-addressed key for a tuple of JSON-serialisable parts.
+    """
+    encoded = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-memory LRU in front of a SQLite table that
+    survives restarts and is shared between worker processes. Values must
+    be JSON-serialisable.
+    """
+
+    def __init__(self, namespace, max_entries=CACHE_MEMORY_ENTRIES, max_disk_entries=CACHE_DISK_ENTRIES, path=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.path = path or os.path.join(CACHE_DIR, "cache.db")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connections = SqliteConnections(self.path)
+        with self._connections.get() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.namespace} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache=self.namespace, result="memory_hit")
+                return self._memory[key]
+
+        conn = self._connections.get()
+        row = conn.execute(f"SELECT value FROM {self.namespace} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            CACHE_REQUESTS.inc(cache=self.namespace, result="miss")
+            return default
+
+        value = json.loads(row[0])
+        with conn:
+            conn.execute(f"UPDATE {self.namespace} SET accessed = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+        CACHE_REQUESTS.inc(cache=self.namespace, result="disk_hit")
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value, persist=True):
+        """
+        Store value under key. With persist=False the value is only kept in
+        the in-memory tier of this process.
+        """
+        self._remember(key, value)
+        if not persist:
+            return
+
+        conn = self._connections.get()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.namespace} (key, value, accessed) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % _DISK_TRIM_INTERVAL == 0
+        if trim:
+            self._trim_disk(conn)
+
+    def _trim_disk(self, conn):
+        with conn:
+            conn.execute(
+                f"DELETE FROM {self.namespace} WHERE key NOT IN "
+                f"(SELECT key FROM {self.namespace} ORDER BY accessed DESC LIMIT ?)",
+                (self.max_disk_entries,),
+            )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from conversation_state import session_state
+from llm_service import send_to_llm, LLMError
+import logging
+import os
+import threading
+
+# Approximate number of prompt tokens the conversation history may use.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
+# When enabled, turns that fall out of the budget are folded into a rolling
+# LLM-written summary instead of being dropped.
+CONTEXT_SUMMARIZE = os.environ.get("CONTEXT_SUMMARIZE", "false").lower() in ("1", "true", "yes")
+
+# Fixed per-message overhead for role markers and separators.
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarize")
+# Sessions with a summary update in flight, so turns do not queue duplicates.
+_folding = set()
+_folding_lock = threading.Lock()
+
+
+def estimate_tokens(message):
+    """
+    Cheap token estimate (roughly four characters per token for English
+    text); good enough for budgeting without loading a tokenizer.
+    """
+    return len(message.get("content") or "") // 4 + _MESSAGE_OVERHEAD_TOKENS
+
+
+def _summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+
+def build_context(conversation_state, new_messages, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Returns the messages to send to the LLM: the rolling summary if there is
+    one, then as many of the most recent history messages as fit in the
+    budget, then new_messages.
+    """
+    used = sum(estimate_tokens(m) for m in new_messages)
+    summary = conversation_state.get("history_summary")
+    if summary:
+        used += estimate_tokens(_summary_message(summary))
+
+    history = conversation_state["conversation_history"]
+    start = len(history)
+    while start > 0:
+        cost = estimate_tokens(history[start - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+
+    context = [_summary_message(summary)] if summary else []
+    return context + history[start:] + list(new_messages)
+
+
+def _overflow(history, budget):
+    """
+    Number of oldest messages to remove so that history fits in half the
+    budget. Trimming to half leaves room to grow, so compaction runs once
+    every few turns rather than on every turn.
+    """
+    total = sum(estimate_tokens(m) for m in history)
+    if total <= budget:
+        return 0
+    count = 0
+    while count < len(history) and total > budget // 2:
+        total -= estimate_tokens(history[count])
+        count += 1
+    return count
+
+
+def summarize_messages(summary, messages):
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Update the running summary of a conversation between a user and an assistant helping them fill in a form. "
+        "Keep facts the user has stated, answers they have given and anything they asked to be remembered. "
+        "Return only the updated summary in a few sentences.\n\n"
+        f"Current summary: {summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    return send_to_llm([{"role": "user", "content": prompt}])
+
+
+def _fold_into_summary(session_id, summary, folded):
+    try:
+        try:
+            summary = summarize_messages(summary, folded)
+        except LLMError as e:
+            # Drop the messages anyway so the history stays bounded.
+            logging.warning(f"Could not summarise conversation history: {e}")
+            summary = None
+        with session_state(session_id) as conversation_state:
+            history = conversation_state["conversation_history"]
+            # Only apply if the history was not reset or compacted meanwhile.
+            if history[:len(folded)] == folded:
+                if summary is not None:
+                    conversation_state["history_summary"] = summary
+                del history[:len(folded)]
+    finally:
+        with _folding_lock:
+            _folding.discard(session_id)
+
+
+def compact_history(session_id, conversation_state, budget=CONTEXT_TOKEN_BUDGET, summarize=CONTEXT_SUMMARIZE):
+    """
+    Keeps the stored history bounded. Without summaries the oldest messages
+    are dropped in place. With summaries they are folded into the rolling
+    summary by a background thread so the current turn does not wait.
+    """
+    history = conversation_state["conversation_history"]
+    count = _overflow(history, budget)
+    if not count:
+        return
+    if summarize:
+        with _folding_lock:
+            if session_id in _folding:
+                return
+            _folding.add(session_id)
+        _summary_executor.submit(_fold_into_summary, session_id, conversation_state.get("history_summary", ""), history[:count])
+    else:
+        del history[:count]
@@ -1,11 +1,179 @@
-conversation_state = {
+import copy
+import json
+import os
+import threading
+import time
+from cache import CACHE_DIR, SqliteConnections
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_STATE = {
+    "original_questions": [],
     "questions": [],
     "current_question_index": 0,
     "answers": [],
+    "original_pdf_path": "",
+    "original_pdf_hash": "",
+    "completed_form": {},
     "file_processed": False,
     "in_question_mode": False,
     "awaiting_answer": False,
     "conversation_history": [],
+    "history_summary": "",
     "language": "english",
     "validation_attempts": {},
+    "review_queue": [],
 }
+
+# "memory" keeps sessions inside this process; "sqlite" shares them between
+# worker processes through a local database file. The file holds users'
+# answers, so it must not be under TEMP_DIR, which /download serves.
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", os.path.join(CACHE_DIR, "sessions.db"))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 60 * 60))
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 1000))
+
+
+def new_state():
+    return copy.deepcopy(DEFAULT_STATE)
+
+
+class MemoryStateStore:
+    """
+    In-process store with LRU eviction once max_entries is reached and
+    expiry of entries not touched for ttl seconds.
+    """
+
+    def __init__(self, max_entries=MAX_SESSIONS, ttl=SESSION_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            touched, value = entry
+            if time.time() - touched > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            # Callers mutate what they get back, so hand out a private copy.
+            return copy.deepcopy(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    @contextmanager
+    def locked(self, key):
+        # Entries only live in this process, so the session lock is enough.
+        yield
+
+
+class SqliteStateStore:
+    """
+    Store backed by a SQLite file so several worker processes can serve the
+    same sessions. Values are stored as JSON; expired rows are purged lazily.
+    locked() makes a read-modify-write atomic across processes.
+    """
+
+    def __init__(self, path=STATE_DB_PATH, table="sessions", ttl=SESSION_TTL_SECONDS):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._connections = SqliteConnections(path)
+        with self._connections.get() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, touched REAL NOT NULL)"
+            )
+            # Every set purges expired rows by touched.
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_touched ON {table} (touched)")
+
+    def get(self, key):
+        conn = self._connections.get()
+        row = conn.execute(
+            f"SELECT value, touched FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        # Expired rows are left for the purge in set, so a get inside
+        # locked() does not commit the transaction early.
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connections.get()
+        now = time.time()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, touched) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now),
+            )
+            conn.execute(f"DELETE FROM {self.table} WHERE touched < ?", (now - self.ttl,))
+
+    def delete(self, key):
+        conn = self._connections.get()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Holds the database write lock, so another process cannot read and
+        write key between our get and set. Keep the enclosed work short.
+        """
+        conn = self._connections.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        if conn.in_transaction:
+            conn.commit()
+
+
+def create_state_store(table="sessions", backend=None, path=None):
+    backend = backend or STATE_BACKEND
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "sqlite":
+        return SqliteStateStore(path=path or STATE_DB_PATH, table=table)
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+state_store = create_state_store()
+
+# Striped locks keep per-session serialisation without one lock per session.
+_session_locks = [threading.Lock() for _ in range(64)]
+
+
+def _lock_for(session_id):
+    return _session_locks[hash(session_id) % len(_session_locks)]
+
+
+@contextmanager
+def session_state(session_id):
+    """
+    Load the state for a session, yield it for mutation and save it back.
+    Requests for the same session are serialised, across processes with the
+    sqlite backend. The lock is shared by several sessions, so do LLM calls
+    and PDF work outside the block.
+    """
+    with _lock_for(session_id), state_store.locked(session_id):
+        state = state_store.get(session_id)
+        if state is None:
+            state = new_state()
+        yield state
+        state_store.set(session_id, state)
+
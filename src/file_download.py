@@ -1,15 +1,146 @@
+import csv
+import io
+import json
+import logging
 import os
-from datetime import datetime
+import re
+import threading
+import time
+import uuid
 
-def generate_qa_file(questions, answers):
-    now = datetime.now()
-    dt_string = now.strftime("%d.%m.%Y_%H_%M_%S")
-    filename = f"qa_{dt_string}.txt"
-    filepath = os.path.join("temp", filename)
-    os.makedirs("temp", exist_ok=True)
+# Absolute, so that send_from_directory does not resolve it against the
+# Flask app's root path instead of the working directory.
+TEMP_DIR = os.path.abspath(os.environ.get("TEMP_DIR", "temp"))
+# Files in temp/ older than this are removed by the janitor.
+TEMP_TTL_SECONDS = float(os.environ.get("TEMP_TTL_SECONDS", 6 * 60 * 60))
+JANITOR_INTERVAL_SECONDS = float(os.environ.get("JANITOR_INTERVAL_SECONDS", 5 * 60))
 
-    with open(filepath, "w", encoding="utf-8") as file:
-        for i, (question, answer) in enumerate(zip(questions, answers)):
-            file.write(f"Q{i + 1}: {question}\nA{i + 1}: {answer}\n\n")
+EXPORT_MIMETYPES = {
+    "txt": "text/plain",
+    "csv": "text/csv",
+    "json": "application/json",
+}
 
-    return filepath
\ No newline at end of file
+# SQLite files are never kept in temp/, but if one is configured there the
+# janitor must not delete it from under the store.
+_KEEP_SUFFIXES = (".db", ".db-wal", ".db-shm", ".db-journal")
+
+# The only files /download serves: filled forms, exports and batch archives.
+# Uploads and anything else in temp/ stay private.
+ARTIFACT_PATTERN = re.compile(r"(filled_form|qa|batch)_[0-9a-f]{32}\.(pdf|txt|csv|json|zip)")
+
+
+def _txt_rows(questions, answers):
+    for i, (question, answer) in enumerate(zip(questions, answers)):
+        yield f"Q{i + 1}: {question}\nA{i + 1}: {answer}\n\n"
+
+
+def _csv_rows(questions, answers):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        row = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return row
+
+    writer.writerow(["number", "question", "answer"])
+    yield flush()
+    for i, (question, answer) in enumerate(zip(questions, answers)):
+        writer.writerow([i + 1, question, answer])
+        yield flush()
+
+
+def _json_rows(questions, answers):
+    yield "["
+    for i, (question, answer) in enumerate(zip(questions, answers)):
+        separator = "," if i else ""
+        yield separator + json.dumps({"number": i + 1, "question": question, "answer": answer}, ensure_ascii=False)
+    yield "]"
+
+
+_EXPORTERS = {
+    "txt": _txt_rows,
+    "csv": _csv_rows,
+    "json": _json_rows,
+}
+
+
+def iter_qa_export(questions, answers, fmt="txt"):
+    """
+    Yields the questions and answers in the given format a row at a time,
+    so they can be streamed to a response without building the whole file.
+    """
+    if fmt not in _EXPORTERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return _EXPORTERS[fmt](questions, answers)
+
+
+def is_artifact(filename):
+    return ARTIFACT_PATTERN.fullmatch(filename) is not None
+
+
+def generate_qa_file(questions, answers, fmt="txt"):
+    """
+    Writes the export to temp/ under a unique artifact id and returns the path.
+    """
+    filename = f"qa_{uuid.uuid4().hex}.{fmt}"
+    filepath = os.path.join(TEMP_DIR, filename)
+    os.makedirs(TEMP_DIR, exist_ok=True)
+
+    with open(filepath, "w", encoding="utf-8", newline="") as file:
+        file.writelines(iter_qa_export(questions, answers, fmt))
+
+    return filepath
+
+
+def sweep_temp_dir(ttl=TEMP_TTL_SECONDS):
+    """
+    Removes files in temp/ not modified for ttl seconds. Returns how many
+    were removed.
+    """
+    cutoff = time.time() - ttl
+    removed = 0
+    try:
+        entries = list(os.scandir(TEMP_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.is_file() or entry.name.endswith(_KEEP_SUFFIXES):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Removed concurrently, e.g. by another worker's janitor.
+            pass
+    return removed
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+def start_janitor(interval=JANITOR_INTERVAL_SECONDS):
+    """
+    Starts the background thread that keeps temp/ bounded. Safe to call
+    more than once.
+    """
+    global _janitor
+
+    def run():
+        while True:
+            try:
+                removed = sweep_temp_dir()
+                if removed:
+                    logging.info(f"Removed {removed} expired files from {TEMP_DIR}")
+            except Exception as e:
+                logging.error(f"Error cleaning {TEMP_DIR}: {e}")
+            time.sleep(interval)
+
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = threading.Thread(target=run, name="temp-janitor", daemon=True)
+            _janitor.start()
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+from cache import CACHE_DIR
+from conversation_state import create_state_store
+import logging
+import os
+import time
+import uuid
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+# A file of its own, so recording a job never waits on a session's write
+# lock in the session database.
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(CACHE_DIR, "jobs.db"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """
+    Runs slow work (PDF parsing, translation, filling) on a worker pool and
+    records status and progress in a job table. The table uses the same
+    store backends as sessions, so with the SQLite backend any worker
+    process can report on a job started by another.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, kind, fn, *args, job_id=None):
+        """
+        Queue fn(report, *args) and return the job id, a new one unless
+        given. fn may call report(progress, message) with progress between
+        0 and 1; its return value becomes the job result.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self.store.set(job_id, {
+            "id": job_id,
+            "kind": kind,
+            "status": QUEUED,
+            "progress": 0.0,
+            "message": "",
+            "result": None,
+            "error": None,
+            "created": now,
+            "updated": now,
+        })
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def update(self, job_id, **changes):
+        # Only the worker running a job writes to its record, so a plain
+        # read-modify-write is safe here.
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        job.update(changes, updated=time.time())
+        self.store.set(job_id, job)
+
+    def _run(self, job_id, fn, args):
+        self.update(job_id, status=RUNNING)
+
+        def report(progress, message=""):
+            self.update(job_id, progress=progress, message=message)
+
+        try:
+            result = fn(report, *args)
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            self.update(job_id, status=FAILED, error=str(e))
+            return
+        self.update(job_id, status=DONE, progress=1.0, result=result)
+
+
+def is_finished(job):
+    return job["status"] in (DONE, FAILED)
+
+
+jobs = JobManager(create_state_store(table="jobs", path=JOBS_DB_PATH))
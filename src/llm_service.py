@@ -1,16 +1,440 @@
+from concurrent.futures import Future
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cache import make_key
+from metrics import LLM_REQUESTS, span, record_llm_tokens
 
-LLM_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
-
-def send_to_llm(messages):
-    payload = {
-        "model": "mistral-7b-instruct-v0.3",
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": -1,
-        "stream": False,
-    }
-    response = requests.post(LLM_API_URL, json=payload)
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
-    return "Error communicating with LLM"
\ No newline at end of file
+try:
+    import httpx
+except ImportError:  # async calls fall back to worker threads
+    httpx = None
+
+LLM_API_URL = os.environ.get("LLM_API_URL", "http://127.0.0.1:1234/v1/chat/completions")
+LLM_MODEL = os.environ.get("LLM_MODEL", "mistral-7b-instruct-v0.3")
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", 120))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BACKOFF = float(os.environ.get("LLM_RETRY_BACKOFF", 0.5))
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", 32))
+# Connections the async client may open at once; further async requests
+# wait for a free connection. Sized separately from the sync pool because
+# awaiting requests do not hold a thread each.
+LLM_ASYNC_POOL_SIZE = int(os.environ.get("LLM_ASYNC_POOL_SIZE", 256))
+# Identical concurrent shared requests wait for one upstream call.
+LLM_COALESCE = os.environ.get("LLM_COALESCE", "true").lower() in ("1", "true", "yes")
+# Batchable single-message prompts arriving within this many milliseconds of
+# each other are packed into one upstream request; 0 disables batching.
+LLM_BATCH_WINDOW_MS = float(os.environ.get("LLM_BATCH_WINDOW_MS", 0))
+LLM_BATCH_MAX_SIZE = int(os.environ.get("LLM_BATCH_MAX_SIZE", 8))
+# Longer prompts are always sent on their own.
+LLM_BATCH_MAX_CHARS = int(os.environ.get("LLM_BATCH_MAX_CHARS", 2000))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+def _parse_sse_line(line):
+    """
+    Returns the content delta carried by one server-sent event line, "" for
+    lines without content, or None once the stream is finished.
+    """
+    if not line or not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        logging.warning(f"Ignoring malformed stream chunk from LLM: {data}")
+        return ""
+    choices = chunk.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+# Result of a batched prompt that has to be sent on its own after all.
+_UNBATCHED = object()
+
+
+def pack_prompts(prompts):
+    return (
+        "Answer each of the following independent requests separately, exactly as if each had been sent on its own. "
+        "Return only a JSON array of strings with one answer per request, in the same order and with the same number of items, "
+        "with no extra commentary or explanations.\n\n"
+        f"Requests: {json.dumps(prompts, ensure_ascii=False)}"
+    )
+
+
+class MicroBatcher:
+    """
+    Collects small single-message prompts for window seconds and sends them
+    to the LLM as one packed request. Each submitted prompt gets a future
+    with its own reply, or with _UNBATCHED when the packed reply could not
+    be split up and the prompt should be sent on its own.
+    """
+
+    def __init__(self, client, window, max_size=LLM_BATCH_MAX_SIZE, max_chars=LLM_BATCH_MAX_CHARS):
+        self.client = client
+        self.window = window
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def accepts(self, messages):
+        return (
+            len(messages) == 1
+            and messages[0].get("role") == "user"
+            and len(messages[0].get("content") or "") <= self.max_chars
+        )
+
+    def submit(self, prompt, options):
+        """
+        Queues prompt with prompts sharing the same sampling options and
+        returns its future.
+        """
+        key = tuple(sorted(options.items()))
+        future = Future()
+        with self._lock:
+            batch = self._pending.setdefault(key, [])
+            batch.append((prompt, future))
+            if len(batch) == 1:
+                timer = threading.Timer(self.window, self._flush_when_due, (key, batch, options))
+                timer.daemon = True
+                timer.start()
+            full = len(batch) >= self.max_size
+            if full:
+                del self._pending[key]
+        if full:
+            # Never flush on the caller's thread: it may be an event loop.
+            threading.Thread(target=self._flush, args=(batch, options), daemon=True).start()
+        return future
+
+    def _flush_when_due(self, key, batch, options):
+        with self._lock:
+            if self._pending.get(key) is not batch:
+                return  # already flushed because it filled up
+            del self._pending[key]
+        self._flush(batch, options)
+
+    def _flush(self, batch, options):
+        if len(batch) == 1:
+            batch[0][1].set_result(_UNBATCHED)
+            return
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            response = self.client._post(self.client._payload([{"role": "user", "content": pack_prompts(prompts)}], False, **options))
+            try:
+                replies = json.loads(response)
+            except json.JSONDecodeError:
+                replies = None
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if isinstance(replies, list) and len(replies) == len(batch):
+            LLM_REQUESTS.inc(len(batch), served="batched")
+            for (_, future), reply in zip(batch, replies):
+                future.set_result(reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False))
+        else:
+            logging.warning(f"Batched reply for {len(batch)} prompts could not be split up; sending them individually")
+            for _, future in batch:
+                future.set_result(_UNBATCHED)
+
+
+class LLMClient:
+    """
+    Client for an OpenAI-compatible chat completions endpoint. Connections
+    are pooled and kept alive, every call has a timeout, and transient
+    failures are retried with exponential backoff.
+
+    Requests made with shared=True are ones whose reply any caller can use,
+    such as translations and question extraction: they are sent with
+    temperature 0 unless the caller sets one, and identical concurrent
+    shared requests share one upstream call. With a batch window, shared
+    requests that are also batchable=True are packed together with other
+    prompts; only pass it for text the app wrote, never for user answers.
+    """
+
+    def __init__(
+        self,
+        url=LLM_API_URL,
+        model=LLM_MODEL,
+        connect_timeout=LLM_CONNECT_TIMEOUT,
+        read_timeout=LLM_READ_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        retry_backoff=LLM_RETRY_BACKOFF,
+        pool_size=LLM_POOL_SIZE,
+        async_pool_size=LLM_ASYNC_POOL_SIZE,
+        coalesce=LLM_COALESCE,
+        batch_window=LLM_BATCH_WINDOW_MS / 1000,
+    ):
+        self.url = url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pool_size = pool_size
+        self.async_pool_size = async_pool_size
+
+        retry = Retry(
+            total=max_retries,
+            # A read timeout means the server is still generating; resending
+            # would only pile more work onto it.
+            read=0,
+            backoff_factor=retry_backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,  # completions are safe to resend
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async_client = None
+        self._async_lock = threading.Lock()
+
+        self.coalesce = coalesce
+        self._batcher = MicroBatcher(self, batch_window) if batch_window > 0 else None
+        # Upstream calls in flight for shared requests, by payload key.
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # The async equivalent; only touched from the event loop.
+        self._ainflight = {}
+
+    def _payload(self, messages, stream, temperature=0.7, max_tokens=-1):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _json(response):
+        try:
+            return response.json()
+        except ValueError as e:
+            raise LLMError(f"LLM returned a response that is not JSON: {response.text[:200]}") from e
+
+    @staticmethod
+    def _content(body):
+        usage = body.get("usage") if isinstance(body, dict) else None
+        if usage:
+            record_llm_tokens(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        try:
+            return body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError(f"Unexpected response from LLM: {body}")
+
+    def _post(self, payload):
+        LLM_REQUESTS.inc(served="upstream")
+        with span("llm_call"):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise LLMError(f"Error communicating with LLM: {e}") from e
+            if response.status_code != 200:
+                raise LLMError(f"LLM returned status {response.status_code}: {response.text[:200]}")
+            return self._content(self._json(response))
+
+    def complete(self, messages, shared=False, batchable=False, **options):
+        if shared:
+            options.setdefault("temperature", 0)
+        payload = self._payload(messages, False, **options)
+        if not (shared and self.coalesce):
+            return self._post(payload)
+
+        key = make_key(payload)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            LLM_REQUESTS.inc(served="coalesced")
+            return future.result()
+
+        try:
+            future.set_result(self._complete_shared(messages, payload, options, batchable))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def _complete_shared(self, messages, payload, options, batchable):
+        if batchable and self._batcher is not None and self._batcher.accepts(messages):
+            reply = self._batcher.submit(messages[0]["content"], options).result()
+            if reply is not _UNBATCHED:
+                return reply
+        return self._post(payload)
+
+    def stream(self, messages, **options):
+        """
+        Yields content deltas as the server produces them.
+        """
+        with span("llm_stream"):
+            try:
+                response = self.session.post(
+                    self.url, json=self._payload(messages, True, **options), timeout=self.timeout, stream=True
+                )
+            except requests.RequestException as e:
+                raise LLMError(f"Error communicating with LLM: {e}") from e
+            # Streams carry no usage block; each delta is roughly one token.
+            deltas = 0
+            with response:
+                if response.status_code != 200:
+                    raise LLMError(f"LLM returned status {response.status_code}: {response.text[:200]}")
+                # SSE is always UTF-8; without a charset requests would leave
+                # lines undecoded, or decode text/* as ISO-8859-1.
+                response.encoding = "utf-8"
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        delta = _parse_sse_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            deltas += 1
+                            yield delta
+                except requests.RequestException as e:
+                    raise LLMError(f"LLM stream interrupted: {e}") from e
+            record_llm_tokens(None, deltas)
+
+    def _get_async_client(self):
+        with self._async_lock:
+            if self._async_client is None:
+                limits = httpx.Limits(max_connections=self.async_pool_size, max_keepalive_connections=self.pool_size)
+                timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+                self._async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+            return self._async_client
+
+    async def _apost(self, payload):
+        client = self._get_async_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.post(self.url, json=payload)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if attempt == self.max_retries:
+                    raise LLMError(f"Error communicating with LLM: {e}") from e
+            except httpx.TransportError as e:
+                # Like the sync client, requests that reached the server are not resent.
+                raise LLMError(f"Error communicating with LLM: {e}") from e
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt) * (1 + random.random() / 2))
+
+    async def _apost_completion(self, payload):
+        LLM_REQUESTS.inc(served="upstream")
+        with span("llm_call"):
+            response = await self._apost(payload)
+            if response.status_code != 200:
+                raise LLMError(f"LLM returned status {response.status_code}: {response.text[:200]}")
+            return self._content(self._json(response))
+
+    async def acomplete(self, messages, shared=False, batchable=False, **options):
+        if httpx is None:
+            return await asyncio.to_thread(self.complete, messages, shared, batchable, **options)
+        if shared:
+            options.setdefault("temperature", 0)
+        payload = self._payload(messages, False, **options)
+        if not (shared and self.coalesce):
+            return await self._apost_completion(payload)
+
+        key = make_key(payload)
+        task = self._ainflight.get(key)
+        if task is None:
+            task = self._ainflight[key] = asyncio.ensure_future(self._acomplete_shared(messages, payload, options, batchable))
+            task.add_done_callback(lambda _: self._ainflight.pop(key, None))
+        else:
+            LLM_REQUESTS.inc(served="coalesced")
+        # Shielded so one waiter disconnecting does not cancel the call for the rest.
+        return await asyncio.shield(task)
+
+    async def _acomplete_shared(self, messages, payload, options, batchable):
+        if batchable and self._batcher is not None and self._batcher.accepts(messages):
+            reply = await asyncio.wrap_future(self._batcher.submit(messages[0]["content"], options))
+            if reply is not _UNBATCHED:
+                return reply
+        return await self._apost_completion(payload)
+
+    async def astream(self, messages, **options):
+        if httpx is None:
+            async for delta in self._astream_in_thread(messages, **options):
+                yield delta
+            return
+
+        client = self._get_async_client()
+        deltas = 0
+        with span("llm_stream"):
+            try:
+                async with client.stream("POST", self.url, json=self._payload(messages, True, **options)) as response:
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        raise LLMError(f"LLM returned status {response.status_code}: {body[:200]!r}")
+                    async for line in response.aiter_lines():
+                        delta = _parse_sse_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            deltas += 1
+                            yield delta
+            except httpx.TransportError as e:
+                raise LLMError(f"Error communicating with LLM: {e}") from e
+        record_llm_tokens(None, deltas)
+
+    async def _astream_in_thread(self, messages, **options):
+        # Without httpx the blocking stream runs in a worker thread and hands
+        # deltas back to the event loop through a queue.
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+
+        def pump():
+            try:
+                for delta in self.stream(messages, **options):
+                    loop.call_soon_threadsafe(queue.put_nowait, delta)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        loop.run_in_executor(None, pump)
+        while True:
+            item = await queue.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def close(self):
+        self.session.close()
+
+
+default_client = LLMClient()
+
+
+def send_to_llm(messages, **options):
+    return default_client.complete(messages, **options)
+
+
+def stream_from_llm(messages, **options):
+    return default_client.stream(messages, **options)
@@ -0,0 +1,176 @@
+from collections import deque
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+# Upper bounds in seconds, spanning fast cache hits to slow LLM completions.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUANTILES = (0.5, 0.95, 0.99)
+# Number of recent observations per label set used for the quantile summary.
+QUANTILE_WINDOW = 2048
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _quantile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus histogram. Alongside the cumulative buckets it keeps a window
+    of recent observations, exported as a "<name>_recent" summary with
+    p50/p95/p99 so percentiles are readable without a Prometheus server.
+    """
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "counts": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                    "recent": deque(maxlen=QUANTILE_WINDOW),
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+            series["recent"].append(value)
+
+    def label_sets(self):
+        with self._lock:
+            return [dict(key) for key in self._series]
+
+    def quantiles(self, **labels):
+        """
+        Returns {quantile: value} over the recent window for one label set.
+        """
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            recent = sorted(series["recent"]) if series else []
+        if not recent:
+            return {}
+        return {q: _quantile(recent, q) for q in QUANTILES}
+
+    def recent_count(self, **labels):
+        """
+        Returns how many observations the quantiles of a label set cover.
+        """
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            return len(series["recent"]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        summary = [f"# HELP {self.name}_recent {self.help_text} (last {QUANTILE_WINDOW} observations)",
+                   f"# TYPE {self.name}_recent summary"]
+        with self._lock:
+            series_items = sorted(
+                (key, list(s["counts"]), s["sum"], s["count"], sorted(s["recent"]))
+                for key, s in self._series.items()
+            )
+        for key, counts, total, count, recent in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = key + (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+
+            for q in QUANTILES:
+                labels = key + (("quantile", str(q)),)
+                summary.append(f"{self.name}_recent{_format_labels(labels)} {_format_value(_quantile(recent, q))}")
+            summary.append(f"{self.name}_recent_sum{_format_labels(key)} {_format_value(sum(recent))}")
+            summary.append(f"{self.name}_recent_count{_format_labels(key)} {len(recent)}")
+        return lines + summary
+
+
+STAGE_SECONDS = Histogram("form_assistant_stage_duration_seconds", "Time spent in each processing stage.")
+REQUEST_SECONDS = Histogram("form_assistant_request_duration_seconds", "Time to produce a response, per endpoint.")
+LLM_TOKENS = Counter("form_assistant_llm_tokens_total", "Tokens sent to and received from the LLM.")
+LLM_REQUESTS = Counter("form_assistant_llm_requests_total", "Completion requests by how they were served.")
+CACHE_REQUESTS = Counter("form_assistant_cache_requests_total", "Cache lookups by cache and outcome.")
+
+
+def record_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    logging.debug(f"Stage {stage} took {seconds:.3f} seconds")
+
+
+@contextmanager
+def span(stage):
+    """
+    Times the enclosed block and records it under the given stage name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_llm_tokens(prompt_tokens, completion_tokens):
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+
+def render_prometheus():
+    """
+    Metrics of this process in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
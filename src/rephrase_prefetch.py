@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from cache import TieredCache, make_key
+from llm_service import send_to_llm
+from Translation_service import translate_text
+import logging
+import os
+import threading
+
+# How many questions, starting with the one on screen, to rephrase ahead of time.
+REPHRASE_PREFETCH_AHEAD = int(os.environ.get("REPHRASE_PREFETCH_AHEAD", 3))
+REPHRASE_PREFETCH_WORKERS = int(os.environ.get("REPHRASE_PREFETCH_WORKERS", 2))
+# Prefetches waiting for or running on the pool; beyond this new ones are
+# dropped rather than queued behind work for other sessions.
+REPHRASE_PREFETCH_QUEUE = int(os.environ.get("REPHRASE_PREFETCH_QUEUE", 16))
+
+# Bump when the rephrase prompt changes so stale cache entries are not reused.
+REPHRASE_PROMPT_VERSION = "1"
+
+rephrase_cache = TieredCache("rephrasings")
+
+_executor = ThreadPoolExecutor(max_workers=REPHRASE_PREFETCH_WORKERS, thread_name_prefix="rephrase")
+# Prefetches of known questions, so a click can wait for one that is
+# already running instead of starting a second call.
+_inflight = {}
+_queued = 0
+_inflight_lock = threading.Lock()
+
+
+def build_rephrase_messages(question):
+    # Construct the prompt to ask the LLM to simplify and explain the question
+    prompt = (
+        "You are a helpful assistant who can simplify language. "
+        "Rephrase the following question in simpler terms and include a brief explanation of what the question is asking. "
+        "Make sure the rephrased version is clear and easy to understand for someone who might struggle with the original phrasing.\n\n"
+        f"Question: {question}"
+    )
+    return [{"role": "user", "content": prompt}]
+
+
+def rephrase_key(question, language):
+    return make_key(question, language.lower(), REPHRASE_PROMPT_VERSION)
+
+
+def store_rephrasing(question, language, rephrasing):
+    rephrase_cache.set(rephrase_key(question, language), rephrasing)
+
+
+def _generate(question, language, original=None):
+    if question is None:
+        # Still being translated; translate_text shares the translation cache.
+        question = translate_text(original, language)
+    rephrasing = rephrase_cache.get(rephrase_key(question, language))
+    if rephrasing is not None:
+        return rephrasing
+    try:
+        rephrasing = send_to_llm(build_rephrase_messages(question), shared=True, batchable=True)
+    except Exception as e:
+        logging.warning(f"Could not prefetch rephrasing: {e}")
+        return None
+    store_rephrasing(question, language, rephrasing)
+    return rephrasing
+
+
+def _prefetch(question, original, language):
+    """
+    Queues one prefetch unless the question is already being prefetched or
+    the queue is full.
+    """
+    global _queued
+    key = rephrase_key(question, language) if question is not None else None
+    with _inflight_lock:
+        if (key is not None and key in _inflight) or _queued >= REPHRASE_PREFETCH_QUEUE:
+            return
+        _queued += 1
+        future = _executor.submit(_generate, question, language, original)
+        if key is not None:
+            _inflight[key] = future
+    # Registered outside the lock: it runs immediately if the call already finished.
+    future.add_done_callback(lambda _: _forget(key))
+
+
+def _forget(key):
+    global _queued
+    with _inflight_lock:
+        _queued -= 1
+        if key is not None:
+            _inflight.pop(key, None)
+
+
+def inflight_rephrasing(question, language):
+    """
+    Returns the future of a prefetch of this rephrasing that is already
+    running, or None. A prefetch still waiting in the queue is cancelled,
+    since the caller is about to make the call itself.
+    """
+    with _inflight_lock:
+        future = _inflight.get(rephrase_key(question, language))
+    if future is None or future.cancel():
+        return None
+    return future
+
+
+def cached_rephrasing(question, language, wait=True):
+    """
+    Returns a prefetched rephrasing, waiting for one that is being generated
+    when wait is true, or None if there is none.
+    """
+    rephrasing = rephrase_cache.get(rephrase_key(question, language))
+    if rephrasing is not None or not wait:
+        return rephrasing
+    future = inflight_rephrasing(question, language)
+    return future.result() if future is not None else None
+
+
+def get_rephrasing(question, language):
+    """
+    Returns the rephrasing for question, from the cache when it was
+    prefetched and from a live LLM call on this thread otherwise.
+    """
+    rephrasing = cached_rephrasing(question, language)
+    if rephrasing is not None:
+        return rephrasing
+    rephrasing = send_to_llm(build_rephrase_messages(question), shared=True, batchable=True)
+    store_rephrasing(question, language, rephrasing)
+    return rephrasing
+
+
+def prefetch_upcoming(conversation_state):
+    """
+    Queue rephrasings for the question on screen and the next few, so the
+    Explain button usually finds one ready.
+    """
+    language = conversation_state["language"]
+    first = max(conversation_state["current_question_index"] - 1, 0)
+    for index in range(first, min(first + REPHRASE_PREFETCH_AHEAD, len(conversation_state["questions"]))):
+        _prefetch(
+            conversation_state["questions"][index],
+            conversation_state["original_questions"][index],
+            language,
+        )
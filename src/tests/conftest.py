@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+# Set before the app modules are imported: their settings are read once at
+# import time, and nothing should touch the developer's temp/ and cache/.
+_work_dir = tempfile.mkdtemp(prefix="form_assistant_tests_")
+os.environ.setdefault("TEMP_DIR", os.path.join(_work_dir, "temp"))
+os.environ.setdefault("CACHE_DIR", os.path.join(_work_dir, "cache"))
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_work_dir, "sessions.db"))
+
+from benchmarks.stub_llm import StubLLMServer  # noqa: E402
+
+# Background prefetches and translations talk to a local stub, never a real model.
+_stub = StubLLMServer(latency=0, tokens_per_second=100000).start()
+os.environ["LLM_API_URL"] = _stub.url
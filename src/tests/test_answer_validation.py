@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+import answer_validation
+from answer_validation import answer_kind, collect_flagged, local_check, validate_in_background, wait_for_validations
+
+
+@pytest.mark.parametrize("question, kind", [
+    ("Email address", "email"),
+    ("Date of birth", "date"),
+    ("Phone number", "phone"),
+    ("Annual income", "number"),
+    ("Full name", None),
+])
+def test_answer_kind(question, kind):
+    assert answer_kind(question) == kind
+
+
+@pytest.mark.parametrize("kind, answer, verdict", [
+    ("email", "ada@example.com", True),
+    ("email", "no address", False),
+    ("email", "ada@example", None),
+    ("date", "10/12/1815", True),
+    ("date", "yesterday", False),
+    ("date", "December 10th 1815", None),
+    ("phone", "+44 (0)20 7946 0958", True),
+    ("phone", "none", False),
+    ("number", "£45,000", True),
+    ("number", "about forty", None),
+])
+def test_local_check(kind, answer, verdict):
+    assert local_check(kind, answer) is verdict
+
+
+@pytest.fixture
+def validate(monkeypatch):
+    """
+    Replaces validate_answer with one that blocks until release is set and
+    re-asks answers of "bad".
+    """
+    release = threading.Event()
+
+    def validate_answer(question, answer, language):
+        release.wait(5)
+        return f"Again: {question}" if answer == "bad" else None
+
+    monkeypatch.setattr(answer_validation, "validate_answer", validate_answer)
+    yield release
+    release.set()
+
+
+def test_only_finished_validations_are_collected(validate):
+    validate_in_background("s", "collect", 0, "Full name", "bad", "english")
+    assert collect_flagged("s", "collect", ["bad"]) == []
+
+    validate_in_background("s", "collect", 0, "Full name", "bad", "english")
+    validate.set()
+    wait_for_validations("s", "collect")
+    assert collect_flagged("s", "collect", ["bad"]) == [{"index": 0, "question": "Again: Full name"}]
+
+
+def test_changed_answers_are_not_flagged(validate):
+    validate.set()
+    validate_in_background("s", "changed", 0, "Full name", "bad", "english")
+    wait_for_validations("s", "changed")
+    assert collect_flagged("s", "changed", ["Ada"]) == []
+
+
+def test_same_answer_is_validated_once(validate):
+    first = validate_in_background("s", "repeat", 0, "Full name", "Ada", "english")
+    assert validate_in_background("s", "repeat", 0, "Full name", "Ada", "english") is first
+    assert validate_in_background("s", "repeat", 0, "Full name", "Bob", "english") is not first
+
+
+def test_queue_is_bounded(validate, monkeypatch):
+    queued = answer_validation._queued
+    monkeypatch.setattr(answer_validation, "VALIDATION_QUEUE", queued + 2)
+    futures = [validate_in_background("s", "bounded", i, "Full name", "Ada", "english") for i in range(3)]
+    assert futures[2] is None
+    validate.set()
+    # The slots are released by done callbacks, just after the futures finish.
+    deadline = time.monotonic() + 5
+    while answer_validation._queued > queued and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert validate_in_background("s", "bounded", 2, "Full name", "Ada", "english") is not None
@@ -0,0 +1,127 @@
+import os
+import uuid
+from io import BytesIO
+
+import pytest
+
+import answer_validation
+import conversation_state
+from app import app
+from benchmarks.make_pdfs import make_form_pdf
+from conversation_state import SqliteStateStore, session_state
+from file_download import TEMP_DIR
+from jobs import jobs
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def session_id():
+    return uuid.uuid4().hex
+
+
+@pytest.fixture
+def flag_bad_answers(monkeypatch):
+    # Re-ask any answer of "bad" without calling the LLM.
+    def validate_answer(question, answer, language):
+        return f"Please answer again: {question}" if answer == "bad" else None
+
+    monkeypatch.setattr(answer_validation, "validate_answer", validate_answer)
+
+
+def upload(client, session_id, fields):
+    response = client.post(
+        "/upload",
+        data={"file": (BytesIO(make_form_pdf(fields)), "form.pdf")},
+        headers={"Session-Id": session_id},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    return response.get_json()["reply"]
+
+
+def answer(client, session_id, message):
+    response = client.post("/chat", json={"message": message}, headers={"Session-Id": session_id})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_form_turns_ask_each_question_in_order(client, session_id):
+    assert upload(client, session_id, 3) == "Q1 | Full name"
+    assert answer(client, session_id, "Ada Lovelace")["reply"] == "Q2 | Date of birth"
+    assert answer(client, session_id, "10/12/1815")["reply"] == "Q3 | Email address"
+
+    done = answer(client, session_id, "ada@example.com")
+
+    assert done["download_link"].startswith("/download/filled_form_")
+    assert client.get(done["download_link"]).status_code == 200
+    with session_state(session_id) as state:
+        assert state["in_question_mode"] is False
+        assert state["completed_form"]["answers"] == ["Ada Lovelace", "10/12/1815", "ada@example.com"]
+
+
+def test_flagged_answers_are_re_asked_before_the_form_is_filled(client, session_id, flag_bad_answers):
+    upload(client, session_id, 3)
+    answer(client, session_id, "bad")
+    answer(client, session_id, "10/12/1815")
+
+    reask = answer(client, session_id, "bad")
+
+    assert reask == {"reply": "Please answer again: Q1 | Full name"}
+    with session_state(session_id) as state:
+        assert [item["index"] for item in state["review_queue"]] == [0, 2]
+
+    assert answer(client, session_id, "Ada Lovelace") == {"reply": "Please answer again: Q3 | Email address"}
+    rephrase = client.post("/rephrase", headers={"Session-Id": session_id}).get_json()
+    assert "Please answer again: Q3 | Email address" in rephrase["reply"]
+
+    done = answer(client, session_id, "ada@example.com")
+
+    assert "download_link" in done
+    with session_state(session_id) as state:
+        assert state["review_queue"] == []
+        assert state["completed_form"]["answers"] == ["Ada Lovelace", "10/12/1815", "ada@example.com"]
+
+
+def test_answers_changed_since_validation_are_not_re_asked(client, session_id, flag_bad_answers):
+    upload(client, session_id, 2)
+    answer(client, session_id, "bad")
+    with session_state(session_id) as state:
+        state["answers"][0] = "Ada Lovelace"
+
+    done = answer(client, session_id, "10/12/1815")
+
+    assert "download_link" in done
+
+
+def test_download_serves_only_generated_artifacts(client, session_id):
+    upload(client, session_id, 1)
+    uploads = [name for name in os.listdir(TEMP_DIR) if name.endswith("_form.pdf")]
+    assert uploads
+    assert client.get(f"/download/{uploads[0]}").status_code == 404
+
+    with open(os.path.join(TEMP_DIR, "sessions.db-wal"), "w") as file:
+        file.write("answers")
+    assert client.get("/download/sessions.db-wal").status_code == 404
+
+    done = answer(client, session_id, "Ada Lovelace")
+    assert client.get(done["download_link"]).status_code == 200
+
+
+def test_async_fill_job_is_queued_outside_the_session_lock(client, session_id, monkeypatch, tmp_path):
+    # Sessions and jobs in one SQLite file: submitting the job while the
+    # session's write transaction is open would wait on our own lock.
+    path = str(tmp_path / "shared.db")
+    monkeypatch.setattr(conversation_state, "state_store", SqliteStateStore(path=path))
+    monkeypatch.setattr(jobs, "store", SqliteStateStore(path=path, table="jobs"))
+    upload(client, session_id, 1)
+
+    response = client.post("/chat?async=1", json={"message": "Ada Lovelace"}, headers={"Session-Id": session_id})
+
+    assert response.status_code == 200
+    job_id = response.get_json()["job_id"]
+    events = client.get(f"/jobs/{job_id}/events").get_data(as_text=True)
+    assert '"status": "done"' in events
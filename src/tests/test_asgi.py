@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import uuid
+from io import BytesIO
+
+import httpx
+import pytest
+
+import answer_validation
+import app as flask_module
+import asgi
+from benchmarks.make_pdfs import make_form_pdf
+from llm_service import default_client
+
+
+def run(requests):
+    """
+    Runs requests(client) against the ASGI app and returns its result.
+    """
+    async def main():
+        transport = httpx.ASGITransport(app=asgi.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await requests(client)
+        finally:
+            # As the lifespan handler does; the next test runs a new event loop.
+            await default_client.aclose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def headers():
+    return {"Session-Id": uuid.uuid4().hex}
+
+
+async def upload(client, headers, fields, language="english"):
+    response = await client.post(
+        "/upload",
+        files={"file": ("form.pdf", BytesIO(make_form_pdf(fields)), "application/pdf")},
+        headers={**headers, "Language": language},
+    )
+    assert response.status_code == 200
+    return response.json()["reply"]
+
+
+def test_free_chat_is_answered_by_the_async_client(headers):
+    async def requests(client):
+        return await client.post("/chat", json={"message": "hello"}, headers=headers)
+
+    response = run(requests)
+    assert response.status_code == 200
+    assert response.json()["reply"].startswith("This is a stub reply")
+
+
+def test_chat_stream_sends_deltas_and_done(headers):
+    async def requests(client):
+        return await client.post("/chat/stream", json={"message": "hello"}, headers=headers)
+
+    response = run(requests)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: done" in response.text
+
+
+def test_form_turns_are_translated_and_warmed_without_threads(headers, monkeypatch):
+    def no_blocking_wait(*args, **kwargs):
+        raise AssertionError("the ASGI app must not wait for validations in a thread")
+
+    monkeypatch.setattr(flask_module, "wait_for_validations", no_blocking_wait)
+    monkeypatch.setattr(
+        answer_validation, "validate_answer", lambda question, answer, language: "Again?" if answer == "bad" else None
+    )
+
+    async def requests(client):
+        first = await upload(client, headers, 2, language="french")
+        second = await client.post("/chat", json={"message": "Ada", "language": "french"}, headers=headers)
+        last = await client.post("/chat", json={"message": "bad", "language": "french"}, headers=headers)
+        return first, second.json(), last.json()
+
+    first, second, last = run(requests)
+    assert first == "~Q1 | Full name"
+    assert second == {"reply": "~Q2 | Date of birth"}
+    # Answers are translated to English before validation, so the stub's
+    # "~bad" is not flagged; the form is completed.
+    assert "download_link" in last
+
+
+def test_final_turn_waits_for_validations_on_the_event_loop(headers, monkeypatch):
+    release = threading.Event()
+
+    def validate_answer(question, answer, language):
+        release.wait(5)
+        return "Again: " + question if answer == "bad" else None
+
+    monkeypatch.setattr(answer_validation, "validate_answer", validate_answer)
+
+    async def requests(client):
+        await upload(client, headers, 2)
+        await client.post("/chat", json={"message": "bad"}, headers=headers)
+        final = asyncio.ensure_future(client.post("/chat", json={"message": "10/12/1815"}, headers=headers))
+        await asyncio.sleep(0.2)
+        # Other routes are still served while the final turn waits.
+        metrics = await client.get("/metrics")
+        assert not final.done()
+        release.set()
+        return metrics, (await final).json()
+
+    metrics, final = run(requests)
+    assert metrics.status_code == 200
+    assert final == {"reply": "Again: Q1 | Full name"}
+
+
+def test_rephrase_routes(headers):
+    async def requests(client):
+        await upload(client, headers, 2)
+        plain = await client.post("/rephrase", headers=headers)
+        stream = await client.post("/rephrase/stream", headers=headers)
+        return plain, stream
+
+    plain, stream = run(requests)
+    assert plain.json() == {"reply": "In simpler terms, this asks: Q1 | Full name"}
+    assert "event: done" in stream.text
+
+
+def test_flask_routes_are_mounted(headers):
+    async def requests(client):
+        return await client.get("/jobs/unknown", headers={**headers, "Origin": "http://localhost:3000"})
+
+    response = run(requests)
+    assert response.status_code == 404
+    assert response.headers["access-control-allow-origin"] == "*"
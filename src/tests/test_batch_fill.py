@@ -0,0 +1,70 @@
+import io
+import zipfile
+
+import pytest
+from PyPDF2 import PdfReader
+
+from app import app
+from batch_fill import fill_batch, output_names, read_answer_rows, write_zip
+from benchmarks.make_pdfs import make_form_pdf
+
+
+def test_read_csv_rows():
+    rows = read_answer_rows(io.BytesIO("﻿Q1 | Full name,_filename\nAda,ada\n".encode("utf-8")), "csv")
+    assert rows == [{"Q1 | Full name": "Ada", "_filename": "ada"}]
+
+
+def test_read_jsonl_rows_skips_blank_lines():
+    rows = read_answer_rows(io.BytesIO(b'{"a": "1"}\n\n{"a": 2}\n'), "jsonl")
+    assert rows == [{"a": "1"}, {"a": 2}]
+
+
+@pytest.mark.parametrize("data", [b'{"a": "1"}\n[1, 2]\n', b"not json\n"])
+def test_read_jsonl_rejects_rows_that_are_not_objects(data):
+    with pytest.raises(ValueError):
+        read_answer_rows(io.BytesIO(data), "jsonl")
+
+
+def test_output_names_are_unique_and_safe():
+    rows = [{"_filename": "a"}, {"_filename": "a.pdf"}, {"_filename": "../A.PDF"}, {}]
+    assert output_names(rows) == ["a.pdf", "a_2.pdf", "A_3.pdf", "filled_00004.pdf"]
+
+
+def test_fill_batch_fills_every_row():
+    rows = [{"Q1 | Full name": f"Person {i}"} for i in range(3)]
+    archive = io.BytesIO()
+
+    write_zip(fill_batch(make_form_pdf(2), rows, workers=2), rows, archive)
+
+    with zipfile.ZipFile(archive) as files:
+        assert sorted(files.namelist()) == ["filled_00001.pdf", "filled_00002.pdf", "filled_00003.pdf"]
+        page = PdfReader(io.BytesIO(files.read("filled_00002.pdf"))).pages[0]
+    values = {annot.get_object()["/T"]: annot.get_object().get("/V") for annot in page["/Annots"]}
+    assert values["Q1 | Full name"] == "Person 1"
+
+
+def post_batch(template, answers, name="answers.jsonl"):
+    return app.test_client().post(
+        "/batch_fill",
+        data={"template": (io.BytesIO(template), "form.pdf"), "answers": (io.BytesIO(answers), name)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_bad_template_is_a_client_error():
+    response = post_batch(b"not a pdf", b'{"a": "1"}\n')
+    assert response.status_code == 400
+    assert "template" in response.get_json()["error"]
+
+
+def test_bad_answer_rows_are_a_client_error():
+    response = post_batch(make_form_pdf(1), b"[1, 2]\n")
+    assert response.status_code == 400
+    assert "not a JSON object" in response.get_json()["error"]
+
+
+def test_batch_fill_returns_a_zip():
+    response = post_batch(make_form_pdf(1), "Q1 | Full name\nAda\nGrace\n".encode("utf-8"), name="answers.csv")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as files:
+        assert len(files.namelist()) == 2
@@ -0,0 +1,74 @@
+import threading
+
+import cache
+from cache import SqliteConnections, TieredCache, make_key
+from Translation_service import translate_text
+
+
+def test_make_key_is_stable_and_distinguishes_parts():
+    assert make_key("a", "b") == make_key("a", "b")
+    assert make_key("a", "b") != make_key("ab")
+    assert make_key("a", "b") != make_key("b", "a")
+
+
+def test_memory_then_disk_tiers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = TieredCache("t", path=path)
+    first.set("k", {"v": [1, 2]})
+    assert first.get("k") == {"v": [1, 2]}
+    assert first.stats()["hits"] == 1
+
+    # A fresh instance, as after a restart or in another worker, reads disk.
+    second = TieredCache("t", path=path)
+    assert second.get("k") == {"v": [1, 2]}
+    assert second.stats() == {"hits": 1, "disk_hits": 1, "misses": 0, "memory_entries": 1}
+    assert second.get("missing", "default") == "default"
+
+
+def test_unpersisted_values_stay_in_memory(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TieredCache("t", path=path).set("k", "secret", persist=False)
+    assert TieredCache("t", path=path).get("k") is None
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    store = TieredCache("t", max_entries=2, path=str(tmp_path / "cache.db"))
+    for key in "abc":
+        store.set(key, key, persist=False)
+    assert store.get("a") is None
+    assert store.get("c") == "c"
+
+
+def test_disk_tier_is_trimmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_DISK_TRIM_INTERVAL", 5)
+    path = str(tmp_path / "cache.db")
+    store = TieredCache("t", max_entries=1, max_disk_entries=3, path=path)
+    for i in range(5):
+        store.set(str(i), i)
+    rows = SqliteConnections(path).get().execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    assert rows == 3
+
+
+def test_connections_are_per_thread(tmp_path):
+    connections = SqliteConnections(str(tmp_path / "nested" / "db.sqlite"))
+    here = connections.get()
+    assert connections.get() is here
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connections.get()))
+    thread.start()
+    thread.join()
+    assert other[0] is not here
+
+
+def test_translations_are_cached(monkeypatch):
+    calls = []
+
+    def send_to_llm(messages, **options):
+        calls.append(messages)
+        return "Bonjour"
+
+    monkeypatch.setattr("Translation_service.send_to_llm", send_to_llm)
+    assert translate_text("Hello, cache test", "French") == "Bonjour"
+    assert translate_text("Hello, cache test", "french") == "Bonjour"
+    assert translate_text("Hello, cache test", "English") == "Hello, cache test"
+    assert len(calls) == 1
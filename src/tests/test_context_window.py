@@ -0,0 +1,68 @@
+import time
+
+import context_window
+from context_window import build_context, compact_history, estimate_tokens
+from conversation_state import session_state
+
+
+def message(role, chars):
+    return {"role": role, "content": "x" * chars}
+
+
+def test_build_context_keeps_the_most_recent_history_that_fits():
+    history = [message("user", 40), message("assistant", 40), message("user", 40)]
+    new = [message("user", 40)]
+    # Each message costs 14 tokens, so a budget of 42 leaves room for two history messages.
+    context = build_context({"conversation_history": history}, new, budget=42)
+    assert context == history[1:] + new
+
+
+def test_build_context_puts_the_summary_first_and_counts_it():
+    history = [message("user", 40), message("assistant", 40)]
+    state = {"conversation_history": history, "history_summary": "The user is Ada."}
+    summary_cost = estimate_tokens({"content": "Summary of the earlier conversation: The user is Ada."})
+    context = build_context(state, [], budget=summary_cost + 14)
+    assert context[0]["role"] == "system"
+    assert "The user is Ada." in context[0]["content"]
+    assert context[1:] == history[1:]
+
+
+def test_compact_history_drops_oldest_messages_down_to_half_the_budget():
+    history = [message("user", 40) for _ in range(10)]
+    state = {"conversation_history": history}
+    compact_history("compact-drop", state, budget=100, summarize=False)
+    assert len(history) == 3
+    assert sum(estimate_tokens(m) for m in history) <= 50
+
+
+def test_compact_history_leaves_history_within_budget_alone():
+    history = [message("user", 40) for _ in range(3)]
+    compact_history("compact-noop", {"conversation_history": history}, budget=100, summarize=False)
+    assert len(history) == 3
+
+
+def test_compact_history_folds_old_messages_into_the_summary(monkeypatch):
+    monkeypatch.setattr(context_window, "summarize_messages", lambda summary, messages: f"{len(messages)} folded")
+    with session_state("compact-summary") as state:
+        state["conversation_history"].extend(message("user", 40) for _ in range(10))
+        compact_history("compact-summary", state, budget=100, summarize=True)
+        # The current turn is not held up; the fold applies after the lock is released.
+        assert len(state["conversation_history"]) == 10
+
+    deadline = time.monotonic() + 5
+    while "compact-summary" in context_window._folding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with session_state("compact-summary") as state:
+        assert state["history_summary"] == "7 folded"
+        assert len(state["conversation_history"]) == 3
+
+
+def test_fold_is_skipped_when_history_changed_meanwhile(monkeypatch):
+    monkeypatch.setattr(context_window, "summarize_messages", lambda summary, messages: "stale")
+    folded = [message("user", 40)]
+    with session_state("compact-reset") as state:
+        state["conversation_history"].append(message("assistant", 8))
+    context_window._fold_into_summary("compact-reset", "", folded)
+    with session_state("compact-reset") as state:
+        assert state.get("history_summary", "") == ""
+        assert len(state["conversation_history"]) == 1
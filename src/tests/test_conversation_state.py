@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from conversation_state import MemoryStateStore, SqliteStateStore, new_state, session_state
+
+
+def test_sessions_do_not_share_state():
+    with session_state("isolation-a") as state:
+        state["answers"].append("Ada")
+        state["language"] = "french"
+    with session_state("isolation-b") as state:
+        assert state["answers"] == []
+        assert state["language"] == "english"
+    with session_state("isolation-a") as state:
+        assert state["answers"] == ["Ada"]
+
+
+def test_new_state_is_a_fresh_copy():
+    state = new_state()
+    state["answers"].append("x")
+    assert new_state()["answers"] == []
+
+
+def test_state_is_not_saved_when_the_block_fails():
+    with pytest.raises(RuntimeError):
+        with session_state("isolation-failed") as state:
+            state["answers"].append("lost")
+            raise RuntimeError("boom")
+    with session_state("isolation-failed") as state:
+        assert state["answers"] == []
+
+
+def test_same_session_is_serialised():
+    def increment():
+        for _ in range(50):
+            with session_state("isolation-counter") as state:
+                count = state["current_question_index"]
+                time.sleep(0)
+                state["current_question_index"] = count + 1
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with session_state("isolation-counter") as state:
+        assert state["current_question_index"] == 200
+
+
+def test_memory_store_hands_out_copies_and_expires():
+    store = MemoryStateStore(max_entries=2, ttl=60)
+    value = {"answers": []}
+    store.set("a", value)
+    store.get("a")["answers"].append("changed")
+    value["answers"].append("changed")
+    assert store.get("a") == {"answers": []}
+
+    store.set("b", {})
+    store.set("c", {})
+    assert store.get("a") is None  # evicted as least recently used
+
+    store.ttl = 0
+    time.sleep(0.01)
+    assert store.get("c") is None
+
+
+def test_sqlite_store_round_trip_and_expiry(tmp_path):
+    store = SqliteStateStore(path=str(tmp_path / "sessions.db"), ttl=60)
+    with store.locked("a"):
+        assert store.get("a") is None
+        store.set("a", {"answers": ["Ada"]})
+    assert store.get("a") == {"answers": ["Ada"]}
+    store.delete("a")
+    assert store.get("a") is None
+
+    store.set("b", {})
+    store.ttl = 0
+    time.sleep(0.01)
+    assert store.get("b") is None
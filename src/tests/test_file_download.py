@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+import os
+import time
+import uuid
+
+import pytest
+
+import file_download
+from app import app
+from conversation_state import session_state
+from file_download import generate_qa_file, is_artifact, iter_qa_export, sweep_temp_dir
+
+QUESTIONS = ["Full name", 'Say "hi", please']
+ANSWERS = ["Ada, Countess", "café"]
+
+
+def export(fmt):
+    return "".join(iter_qa_export(QUESTIONS, ANSWERS, fmt))
+
+
+def test_txt_export():
+    assert export("txt") == 'Q1: Full name\nA1: Ada, Countess\n\nQ2: Say "hi", please\nA2: café\n\n'
+
+
+def test_csv_export_has_a_header_and_quotes_fields():
+    rows = list(csv.reader(io.StringIO(export("csv"))))
+    assert rows == [["number", "question", "answer"], ["1", "Full name", "Ada, Countess"], ["2", 'Say "hi", please', "café"]]
+
+
+def test_json_export_parses():
+    assert json.loads(export("json")) == [
+        {"number": 1, "question": "Full name", "answer": "Ada, Countess"},
+        {"number": 2, "question": 'Say "hi", please', "answer": "café"},
+    ]
+    assert json.loads("".join(iter_qa_export([], [], "json"))) == []
+
+
+def test_unsupported_format_is_rejected():
+    with pytest.raises(ValueError):
+        iter_qa_export(QUESTIONS, ANSWERS, "xml")
+
+
+def test_generated_file_is_a_downloadable_artifact(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_download, "TEMP_DIR", str(tmp_path))
+    path = generate_qa_file(QUESTIONS, ANSWERS, "csv")
+    assert os.path.dirname(path) == str(tmp_path)
+    assert is_artifact(os.path.basename(path))
+    with open(path, encoding="utf-8", newline="") as file:
+        assert file.read() == export("csv")
+
+
+def test_is_artifact_only_matches_generated_names():
+    assert is_artifact(f"filled_form_{uuid.uuid4().hex}.pdf")
+    assert is_artifact(f"batch_{uuid.uuid4().hex}.zip")
+    assert not is_artifact(f"upload_{uuid.uuid4().hex}.pdf")
+    assert not is_artifact("sessions.db")
+    assert not is_artifact(f"qa_{uuid.uuid4().hex}.txt.bak")
+
+
+def test_sweep_removes_expired_files_but_keeps_databases(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_download, "TEMP_DIR", str(tmp_path))
+    old = time.time() - 3600
+    for name in ("expired.pdf", "state.db", "state.db-wal"):
+        (tmp_path / name).write_text("x")
+        os.utime(tmp_path / name, (old, old))
+    (tmp_path / "fresh.pdf").write_text("x")
+    (tmp_path / "subdir").mkdir()
+
+    assert sweep_temp_dir(ttl=60) == 1
+    assert sorted(os.listdir(tmp_path)) == ["fresh.pdf", "state.db", "state.db-wal", "subdir"]
+
+
+def test_sweep_of_a_missing_directory_removes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_download, "TEMP_DIR", str(tmp_path / "missing"))
+    assert sweep_temp_dir(ttl=0) == 0
+
+
+def test_export_route_streams_and_persists():
+    client = app.test_client()
+    session_id = uuid.uuid4().hex
+    headers = {"Session-Id": session_id}
+    assert client.get("/export?format=xml", headers=headers).status_code == 400
+    assert client.get("/export", headers=headers).status_code == 404
+
+    with session_state(session_id) as state:
+        state["in_question_mode"] = True
+        state["original_questions"] = list(QUESTIONS)
+        state["answers"] = list(ANSWERS)
+
+    response = client.get("/export?format=json", headers=headers)
+    assert response.mimetype == "application/json"
+    assert response.headers["Content-Disposition"] == "attachment; filename=answers.json"
+    assert json.loads(response.get_data(as_text=True))[1]["answer"] == "café"
+
+    link = client.get("/export?format=txt&persist=1", headers=headers).get_json()["download_link"]
+    assert client.get(link).get_data(as_text=True) == export("txt")
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import app
+from conversation_state import MemoryStateStore, SqliteStateStore
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobManager, is_finished, jobs
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if is_finished(job):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def manager(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryStateStore()
+    else:
+        store = SqliteStateStore(path=str(tmp_path / "jobs.db"), table="jobs")
+    return JobManager(store, max_workers=2)
+
+
+def test_job_runs_and_records_its_result(manager):
+    job_id = manager.submit("sum", lambda report, a, b: a + b, 2, 3)
+    job = wait_for(manager, job_id)
+    assert job["kind"] == "sum"
+    assert job["status"] == DONE
+    assert job["progress"] == 1.0
+    assert job["result"] == 5
+    assert job["error"] is None
+
+
+def test_job_reports_progress_while_running(manager):
+    release = threading.Event()
+
+    def work(report):
+        report(0.5, "halfway")
+        release.wait(5)
+        return "ok"
+
+    job_id = manager.submit("slow", work)
+    deadline = time.monotonic() + 5
+    while manager.get(job_id)["progress"] != 0.5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    job = manager.get(job_id)
+    assert job["status"] == RUNNING
+    assert job["message"] == "halfway"
+    assert not is_finished(job)
+    release.set()
+    assert wait_for(manager, job_id)["result"] == "ok"
+
+
+def test_failed_job_records_the_error(manager):
+    def work(report):
+        raise ValueError("no such template")
+
+    job = wait_for(manager, manager.submit("broken", work))
+    assert job["status"] == FAILED
+    assert job["error"] == "no such template"
+    assert job["result"] is None
+
+
+def test_queued_job_keeps_a_given_id():
+    release = threading.Event()
+    manager = JobManager(MemoryStateStore(), max_workers=1)
+    manager.submit("block", lambda report: release.wait(5))
+    job_id = manager.submit("next", lambda report: None, job_id="fixed-id")
+    assert job_id == "fixed-id"
+    assert manager.get("fixed-id")["status"] == QUEUED
+    release.set()
+    assert wait_for(manager, "fixed-id")["status"] == DONE
+
+
+def test_job_routes():
+    client = app.test_client()
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/events").status_code == 404
+
+    job_id = jobs.submit("route", lambda report: {"files": 1})
+    wait_for(jobs, job_id)
+    assert client.get(f"/jobs/{job_id}").get_json()["result"] == {"files": 1}
+
+    response = client.get(f"/jobs/{job_id}/events")
+    body = response.get_data(as_text=True)
+    assert response.mimetype == "text/event-stream"
+    assert "event: done" in body
+    data = [line[len("data: "):] for line in body.splitlines() if line.startswith("data: ")]
+    assert json.loads(data[-1])["status"] == DONE
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_service
+from llm_service import LLMClient, LLMError, MicroBatcher
+
+PROMPT = [{"role": "user", "content": "Translate: hello"}]
+
+
+class FakePost:
+    """
+    Stands in for a client's _post, recording payloads and replying after a
+    short delay so concurrent callers overlap.
+    """
+
+    def __init__(self, reply=lambda payload: "reply", delay=0.2):
+        self.reply = reply
+        self.delay = delay
+        self.payloads = []
+        self._lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self._lock:
+            self.payloads.append(payload)
+        time.sleep(self.delay)
+        return self.reply(payload)
+
+
+def run_concurrently(fn, count):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = fn(i)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_shared_requests_are_coalesced():
+    fake = FakePost()
+    client = LLMClient(batch_window=0)
+    client._post = fake
+
+    results = run_concurrently(lambda i: client.complete(PROMPT, shared=True), 8)
+
+    assert results == ["reply"] * 8
+    assert len(fake.payloads) == 1
+    assert fake.payloads[0]["temperature"] == 0
+
+
+def test_unshared_requests_are_not_coalesced():
+    fake = FakePost(delay=0.05)
+    client = LLMClient(batch_window=0)
+    client._post = fake
+
+    run_concurrently(lambda i: client.complete(PROMPT), 3)
+
+    assert len(fake.payloads) == 3
+    assert fake.payloads[0]["temperature"] == 0.7
+
+
+def test_coalesced_errors_reach_every_caller():
+    def fail(payload):
+        raise LLMError("upstream down")
+
+    fake = FakePost(reply=fail)
+    client = LLMClient(batch_window=0)
+    client._post = fake
+
+    results = run_concurrently(lambda i: client.complete(PROMPT, shared=True), 4)
+
+    assert all(isinstance(result, LLMError) for result in results)
+    assert len(fake.payloads) == 1
+    # The failed call is forgotten, so the next request tries again.
+    with pytest.raises(LLMError):
+        client.complete(PROMPT, shared=True)
+    assert len(fake.payloads) == 2
+
+
+def prompt(i):
+    return f"Rephrase the following question\n\nQuestion: q{i}"
+
+
+def test_batchable_prompts_are_packed():
+    def reply(payload):
+        requests = json.loads(payload["messages"][0]["content"].split("Requests: ", 1)[1])
+        return json.dumps([request.upper() for request in requests])
+
+    fake = FakePost(reply=reply, delay=0)
+    client = LLMClient(batch_window=0.1)
+    client._post = fake
+
+    results = run_concurrently(
+        lambda i: client.complete([{"role": "user", "content": prompt(i)}], shared=True, batchable=True), 3
+    )
+
+    assert results == [prompt(i).upper() for i in range(3)]
+    assert len(fake.payloads) == 1
+
+
+def test_shared_prompts_are_only_batched_when_batchable():
+    fake = FakePost(delay=0)
+    client = LLMClient(batch_window=0.1)
+    client._post = fake
+
+    run_concurrently(lambda i: client.complete([{"role": "user", "content": prompt(i)}], shared=True), 3)
+
+    assert sorted(payload["messages"][0]["content"] for payload in fake.payloads) == [prompt(i) for i in range(3)]
+
+
+def test_micro_batcher_falls_back_when_reply_cannot_be_split():
+    fake = FakePost(reply=lambda payload: "not a JSON array", delay=0)
+    client = LLMClient(batch_window=0)
+    client._post = fake
+    batcher = MicroBatcher(client, window=0.05)
+
+    futures = [batcher.submit(prompt(i), {"temperature": 0}) for i in range(3)]
+
+    assert [future.result(timeout=5) for future in futures] == [llm_service._UNBATCHED] * 3
+    assert len(fake.payloads) == 1
+
+
+def test_micro_batcher_sends_a_lone_prompt_on_its_own():
+    fake = FakePost(delay=0)
+    client = LLMClient(batch_window=0)
+    client._post = fake
+    batcher = MicroBatcher(client, window=0.01)
+
+    assert batcher.submit(prompt(0), {}).result(timeout=5) is llm_service._UNBATCHED
+    assert fake.payloads == []
+
+
+def test_micro_batcher_passes_upstream_errors_on():
+    def fail(payload):
+        raise LLMError("upstream down")
+
+    client = LLMClient(batch_window=0)
+    client._post = FakePost(reply=fail, delay=0)
+    batcher = MicroBatcher(client, window=0.05)
+
+    futures = [batcher.submit(prompt(i), {}) for i in range(2)]
+
+    for future in futures:
+        with pytest.raises(LLMError):
+            future.result(timeout=5)
+
+
+def test_client_falls_back_to_single_calls_after_a_failed_batch():
+    def reply(payload):
+        content = payload["messages"][0]["content"]
+        return "garbled" if "Requests: " in content else content.upper()
+
+    fake = FakePost(reply=reply, delay=0)
+    client = LLMClient(batch_window=0.1)
+    client._post = fake
+
+    results = run_concurrently(
+        lambda i: client.complete([{"role": "user", "content": prompt(i)}], shared=True, batchable=True), 3
+    )
+
+    assert results == [prompt(i).upper() for i in range(3)]
+    assert len(fake.payloads) == 4
+
+
+class Upstream:
+    """
+    Local HTTP server that answers each POST with the next scripted
+    (status, body, delay) and records how many requests arrived.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = 0
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                upstream.requests += 1
+                status, body, delay = upstream.responses.pop(0) if len(upstream.responses) > 1 else upstream.responses[0]
+                time.sleep(delay)
+                body = body.encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/event-stream" if body.startswith(b"data:") else "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass  # the client gave up waiting
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+
+    def client(self, **options):
+        return LLMClient(url=self.url, retry_backoff=0.01, read_timeout=0.5, batch_window=0, **options)
+
+
+def completion(text):
+    return json.dumps({"choices": [{"message": {"content": text}}]})
+
+
+def run_async(client, call):
+    async def main():
+        try:
+            return await call()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def servers():
+    started = []
+    yield lambda *responses: started.append(Upstream(*responses)) or started[-1]
+    for upstream in started:
+        upstream.server.shutdown()
+        upstream.server.server_close()
+
+
+def test_retryable_statuses_are_retried(servers):
+    upstream = servers((503, "busy", 0), (200, completion("hi"), 0))
+    assert upstream.client().complete(PROMPT) == "hi"
+    assert upstream.requests == 2
+
+
+def test_async_retryable_statuses_are_retried(servers):
+    upstream = servers((503, "busy", 0), (200, completion("hi"), 0))
+    client = upstream.client()
+    assert run_async(client, lambda: client.acomplete(PROMPT)) == "hi"
+    assert upstream.requests == 2
+
+
+def test_client_errors_are_not_retried(servers):
+    upstream = servers((400, "bad request", 0))
+    with pytest.raises(LLMError, match="400"):
+        upstream.client().complete(PROMPT)
+    assert upstream.requests == 1
+
+
+def test_read_timeouts_are_not_retried(servers):
+    upstream = servers((200, completion("late"), 1.5))
+    with pytest.raises(LLMError):
+        upstream.client().complete(PROMPT)
+    assert upstream.requests == 1
+
+
+def test_async_read_timeouts_are_not_retried(servers):
+    upstream = servers((200, completion("late"), 1.5))
+    client = upstream.client()
+    with pytest.raises(LLMError):
+        run_async(client, lambda: client.acomplete(PROMPT))
+    assert upstream.requests == 1
+
+
+def test_bodies_that_are_not_json_raise_llm_error(servers):
+    upstream = servers((200, "<html>proxy error</html>", 0))
+    with pytest.raises(LLMError, match="not JSON"):
+        upstream.client().complete(PROMPT)
+    client = upstream.client()
+    with pytest.raises(LLMError, match="not JSON"):
+        run_async(client, lambda: client.acomplete(PROMPT))
+
+
+def test_connection_errors_raise_llm_error():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = LLMClient(url=f"http://127.0.0.1:{port}/", max_retries=1, retry_backoff=0.01, batch_window=0)
+    with pytest.raises(LLMError):
+        client.complete(PROMPT)
+    with pytest.raises(LLMError):
+        run_async(client, lambda: client.acomplete(PROMPT))
+
+
+@pytest.mark.parametrize("line, delta", [
+    ('data: {"choices": [{"delta": {"content": "Hel"}}]}', "Hel"),
+    ('data: {"choices": [{"delta": {}}]}', ""),
+    ("data: not json", ""),
+    (": keep-alive", ""),
+    ("", ""),
+    ("data: [DONE]", None),
+])
+def test_parse_sse_line(line, delta):
+    assert llm_service._parse_sse_line(line) == delta
+
+
+def test_stream_yields_deltas(servers):
+    chunks = "".join(f'data: {json.dumps({"choices": [{"delta": {"content": part}}]})}\n\n' for part in ("Hel", "lo, ", "café"))
+    upstream = servers((200, chunks + "data: [DONE]\n\n", 0))
+    assert "".join(upstream.client().stream(PROMPT)) == "Hello, café"
+
+    client = upstream.client()
+
+    async def collect():
+        return "".join([delta async for delta in client.astream(PROMPT)])
+
+    assert run_async(client, collect) == "Hello, café"
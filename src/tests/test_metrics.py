@@ -0,0 +1,79 @@
+import pytest
+
+import metrics
+from app import app
+from metrics import Counter, Histogram, render_prometheus
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Keep metrics made by these tests out of the process-wide registry.
+    monkeypatch.setattr(metrics, "_registry", [])
+
+
+def test_counter_renders_labelled_totals(registry):
+    counter = Counter("test_requests_total", "Requests.")
+    counter.inc(kind="b")
+    counter.inc(2, kind="a")
+    counter.inc(kind="a")
+    assert counter.render() == [
+        "# HELP test_requests_total Requests.",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{kind="a"} 3.0',
+        'test_requests_total{kind="b"} 1.0',
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    counter = Counter("test_escaped_total", "Escaping.")
+    counter.inc(path='a\\b "c"\nd')
+    assert counter.render()[-1] == 'test_escaped_total{path="a\\\\b \\"c\\"\\nd"} 1.0'
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram("test_seconds", "Durations.", buckets=(1, 0.1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, stage="parse")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="parse",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{stage="parse"} 4.25' in lines
+    assert 'test_seconds_count{stage="parse"} 4' in lines
+    assert "# TYPE test_seconds_recent summary" in lines
+    assert 'test_seconds_recent{stage="parse",quantile="0.5"} 0.7' in lines
+    assert 'test_seconds_recent_count{stage="parse"} 4' in lines
+
+
+def test_histogram_quantiles_use_the_recent_window(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "QUANTILE_WINDOW", 100)
+    histogram = Histogram("test_window_seconds", "Durations.")
+    for value in range(1000):
+        histogram.observe(value / 1000, stage="llm")
+    assert histogram.label_sets() == [{"stage": "llm"}]
+    assert histogram.recent_count(stage="llm") == 100
+    assert histogram.recent_count(stage="other") == 0
+    assert histogram.quantiles(stage="llm") == {0.5: 0.95, 0.95: 0.995, 0.99: 0.999}
+    assert histogram.quantiles(stage="other") == {}
+    # The cumulative count still covers every observation.
+    assert 'test_window_seconds_count{stage="llm"} 1000' in histogram.render()
+
+
+def test_render_prometheus_joins_every_metric(registry):
+    Counter("test_a_total", "A.").inc()
+    Histogram("test_b_seconds", "B.").observe(0.2)
+    text = render_prometheus()
+    assert text.endswith("\n")
+    assert text.index("# TYPE test_a_total counter") < text.index("# TYPE test_b_seconds histogram")
+    assert "test_b_seconds_count 1" in text
+
+
+def test_metrics_route_reports_request_durations():
+    client = app.test_client()
+    client.get("/jobs/missing")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert 'form_assistant_request_duration_seconds_count{endpoint="job_status"}' in body
+    assert 'endpoint="metrics"' not in body
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+
+from benchmarks.make_pdfs import make_form_pdf
+from utils.pdf_filler import PdfTemplate, load_template, pdf_content_hash, template_from_bytes
+
+
+def field_values(pdf_bytes):
+    """
+    Returns {field name: value} read from the widgets of every page.
+    """
+    values = {}
+    for page in PdfReader(BytesIO(pdf_bytes)).pages:
+        for annotation in page.get("/Annots") or []:
+            annotation = annotation.get_object()
+            values[annotation["/T"]] = annotation.get("/V")
+    return values
+
+
+def test_fields_are_mapped_to_their_pages():
+    template = PdfTemplate(make_form_pdf(4, pages=2))
+    assert template.page_count == 2
+    assert template.field_pages == {
+        "Q1 | Full name": [0],
+        "Q2 | Date of birth": [0],
+        "Q3 | Email address": [1],
+        "Q4 | Phone number": [1],
+    }
+    assert template.widget_pages == [0, 1]
+
+
+def test_fill_sets_values_on_every_page():
+    template = PdfTemplate(make_form_pdf(4, pages=2))
+    values = field_values(template.fill({"Q1 | Full name": "Ada", "Q4 | Phone number": "0123"}))
+    assert values["Q1 | Full name"] == "Ada"
+    assert values["Q4 | Phone number"] == "0123"
+
+
+def test_fills_do_not_leak_into_each_other():
+    template = PdfTemplate(make_form_pdf(2))
+    first = template.fill({"Q1 | Full name": "Ada"})
+    second = template.fill({"Q2 | Date of birth": "10/12/1815"})
+
+    assert field_values(first).get("Q2 | Date of birth") in (None, "")
+    assert field_values(second).get("Q1 | Full name") in (None, "")
+
+
+def test_concurrent_fills_are_independent():
+    template = PdfTemplate(make_form_pdf(2))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        filled = list(executor.map(lambda i: template.fill({"Q1 | Full name": f"Person {i}"}), range(16)))
+    assert [field_values(pdf)["Q1 | Full name"] for pdf in filled] == [f"Person {i}" for i in range(16)]
+
+
+def test_templates_are_cached_by_content(tmp_path):
+    data = make_form_pdf(3)
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(data)
+
+    template = load_template(str(tmp_path / "a.pdf"))
+
+    assert load_template(str(tmp_path / "b.pdf")) is template
+    assert load_template("/missing.pdf", pdf_content_hash(data)) is template
+    assert template_from_bytes(data) is template
@@ -0,0 +1,136 @@
+from io import BytesIO
+import json
+
+import pytest
+
+from benchmarks.make_pdfs import make_form_pdf
+from cache import TieredCache, make_key
+from utils import pdf_processor
+from utils.pdf_filler import pdf_content_hash
+from utils.pdf_processor import chunk_text, merge_questions
+
+
+def test_chunk_text_keeps_short_text_whole():
+    assert chunk_text("Q1 | Name\nQ2 | Age\n", max_chars=100) == ["Q1 | Name\nQ2 | Age\n"]
+
+
+def test_chunk_text_groups_whole_pages():
+    pages = ["a" * 40, "b" * 40, "c" * 40]
+    chunks = chunk_text("\f".join(pages), max_chars=100)
+    assert chunks == ["a" * 40 + "\f" + "b" * 40, "c" * 40]
+
+
+def test_chunk_text_splits_long_pages_on_lines():
+    page = "".join(f"Q{i} | question {i}\n" for i in range(20))
+    chunks = chunk_text(page, max_chars=60)
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert "".join(chunks) == page
+    assert all(chunk.endswith("\n") for chunk in chunks)
+
+
+def test_chunk_text_drops_blank_text():
+    assert chunk_text("  \n") == []
+
+
+def test_merge_questions_keeps_order_and_drops_repeats():
+    merged = merge_questions([
+        ["Q1 | Full name", "Q2 | Date of birth"],
+        ["q1 |  full name ", "Q3 | Email address", ""],
+        ["Q2 | Date of birth"],
+    ])
+    assert merged == ["Q1 | Full name", "Q2 | Date of birth", "Q3 | Email address"]
+
+
+def test_numbered_questions_are_found_without_the_llm(monkeypatch):
+    def no_llm(text):
+        raise AssertionError("the LLM should not be called")
+
+    monkeypatch.setattr(pdf_processor, "_llm_questions", no_llm)
+
+    questions, cacheable = pdf_processor._questions_from_text("Intro\nQ1 | Name\n\fQ2 | Age\nQ1 | Name\n")
+
+    assert questions == ["Q1 | Name", "Q2 | Age"]
+    assert cacheable
+
+
+def test_llm_fallback_runs_per_chunk_and_merges(monkeypatch):
+    prompts = []
+
+    def llm_questions(chunk):
+        prompts.append(chunk)
+        return [line for line in chunk.split("\f")[0].splitlines() if line.endswith("?")] + ["What is your name?"]
+
+    monkeypatch.setattr(pdf_processor, "chunk_text", lambda text: chunk_text(text, max_chars=30))
+    monkeypatch.setattr(pdf_processor, "_llm_questions", llm_questions)
+    text = "What is your name?\n" + "\f".join(f"Page {i}\nWhere do you live {i}?\n" for i in range(3))
+
+    questions, cacheable = pdf_processor._questions_from_text(text)
+
+    assert len(prompts) > 1
+    assert questions[0] == "What is your name?"
+    assert questions.count("What is your name?") == 1
+    assert cacheable
+
+
+def test_failed_chunks_are_not_cached(monkeypatch):
+    def llm_questions(chunk):
+        if "broken" in chunk:
+            raise json.JSONDecodeError("bad", "", 0)
+        return ["Where do you live?"]
+
+    monkeypatch.setattr(pdf_processor, "chunk_text", lambda text: chunk_text(text, max_chars=20))
+    monkeypatch.setattr(pdf_processor, "_llm_questions", llm_questions)
+
+    questions, cacheable = pdf_processor._questions_from_text("fine page\fbroken page")
+
+    assert questions == ["Where do you live?"]
+    assert not cacheable
+
+
+@pytest.fixture
+def fresh_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(pdf_processor, "extraction_cache", TieredCache("pdf_extraction", path=path))
+    return lambda: TieredCache("pdf_extraction", path=path)
+
+
+def test_form_fields_are_cached_by_content(fresh_cache, monkeypatch):
+    calls = []
+    read_fields = pdf_processor._read_acroform_fields
+    monkeypatch.setattr(pdf_processor, "_read_acroform_fields", lambda data: calls.append(data) or read_fields(data))
+    data = make_form_pdf(3)
+
+    first = pdf_processor.extract_form_fields_from_pdf(BytesIO(data))
+    second = pdf_processor.extract_form_fields_from_pdf(BytesIO(data))
+
+    assert len(first) == 3
+    assert second == first
+    assert len(calls) == 1
+    # A blank form's field names survive a restart.
+    assert fresh_cache().get(make_key("fields", pdf_content_hash(data))) == first
+
+
+def test_filled_values_and_text_stay_in_memory(fresh_cache, monkeypatch):
+    monkeypatch.setattr(pdf_processor, "_read_acroform_fields", lambda data: {"Name": "Ada"})
+    filled = make_form_pdf(1)
+    assert pdf_processor.extract_form_fields_from_pdf(BytesIO(filled)) == {"Name": "Ada"}
+    assert fresh_cache().get(make_key("fields", pdf_content_hash(filled))) is None
+
+    monkeypatch.setattr(pdf_processor, "_read_acroform_fields", lambda data: {})
+    plain = make_form_pdf(2, acroform=False)
+    questions = pdf_processor.extract_form_fields_from_pdf(BytesIO(plain))
+    digest = pdf_content_hash(plain)
+    assert len(questions) == 2
+    assert fresh_cache().get(make_key("text", digest)) is None
+    assert fresh_cache().get(make_key("questions", digest, pdf_processor.QUESTION_PROMPT_VERSION)) == list(questions)
+
+
+def test_cached_questions_skip_text_extraction(fresh_cache, monkeypatch):
+    data = make_form_pdf(2, acroform=False)
+    first = pdf_processor.extract_form_fields_from_pdf(BytesIO(data))
+
+    def no_extraction(pdf_file):
+        raise AssertionError("text should not be extracted again")
+
+    monkeypatch.setattr(pdf_processor, "extract_text_from_pdf", no_extraction)
+    assert pdf_processor.extract_form_fields_from_pdf(BytesIO(data)) == first
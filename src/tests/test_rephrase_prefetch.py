@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import rephrase_prefetch
+from cache import TieredCache
+from rephrase_prefetch import cached_rephrasing, get_rephrasing, inflight_rephrasing, prefetch_upcoming
+
+
+class FakeLLM:
+    """
+    Stands in for send_to_llm; calls block until release() so tests can
+    look at prefetches while they are queued or running.
+    """
+
+    def __init__(self):
+        self.questions = []
+        self.started = threading.Semaphore(0)
+        self._release = threading.Event()
+
+    def __call__(self, messages, **options):
+        question = messages[0]["content"].split("Question: ", 1)[1]
+        self.questions.append(question)
+        self.started.release()
+        self._release.wait(5)
+        return f"Simpler: {question}"
+
+    def release(self):
+        self._release.set()
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    fake = FakeLLM()
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(rephrase_prefetch, "send_to_llm", fake)
+    monkeypatch.setattr(rephrase_prefetch, "_executor", executor)
+    monkeypatch.setattr(rephrase_prefetch, "rephrase_cache", TieredCache("rephrasings", path=str(tmp_path / "cache.db")))
+    yield fake
+    fake.release()
+    executor.shutdown(wait=True)
+    assert rephrase_prefetch._queued == 0
+    assert rephrase_prefetch._inflight == {}
+
+
+def test_prefetches_are_deduplicated_and_bounded(llm, monkeypatch):
+    monkeypatch.setattr(rephrase_prefetch, "REPHRASE_PREFETCH_QUEUE", 2)
+    rephrase_prefetch._prefetch("Q1", "Q1", "english")
+    rephrase_prefetch._prefetch("Q1", "Q1", "english")
+    rephrase_prefetch._prefetch("Q2", "Q2", "english")
+    rephrase_prefetch._prefetch("Q3", "Q3", "english")
+    assert rephrase_prefetch._queued == 2
+
+    llm.release()
+    assert cached_rephrasing("Q1", "english") == "Simpler: Q1"
+    assert cached_rephrasing("Q2", "english") == "Simpler: Q2"
+    assert cached_rephrasing("Q3", "english") is None
+    assert sorted(llm.questions) == ["Q1", "Q2"]
+
+
+def test_running_prefetch_is_awaited_and_queued_one_cancelled(llm):
+    rephrase_prefetch._prefetch("Q1", "Q1", "english")
+    rephrase_prefetch._prefetch("Q2", "Q2", "english")
+    assert llm.started.acquire(timeout=5)
+
+    # Q2 is still behind Q1 on the single worker, so it is cancelled.
+    assert inflight_rephrasing("Q2", "english") is None
+    running = inflight_rephrasing("Q1", "english")
+    assert running is not None
+
+    llm.release()
+    assert running.result(timeout=5) == "Simpler: Q1"
+    assert get_rephrasing("Q2", "english") == "Simpler: Q2"
+    assert llm.questions == ["Q1", "Q2"]
+
+
+def test_cached_rephrasing_without_wait_does_not_block(llm):
+    rephrase_prefetch._prefetch("Q1", "Q1", "english")
+    assert llm.started.acquire(timeout=5)
+    assert cached_rephrasing("Q1", "english", wait=False) is None
+    llm.release()
+    assert cached_rephrasing("Q1", "english") == "Simpler: Q1"
+
+
+def test_get_rephrasing_calls_the_llm_once_then_uses_the_cache(llm):
+    llm.release()
+    assert get_rephrasing("Q1", "English") == "Simpler: Q1"
+    assert get_rephrasing("Q1", "english") == "Simpler: Q1"
+    assert llm.questions == ["Q1"]
+
+
+def test_prefetch_upcoming_covers_the_question_on_screen_and_the_next_few(llm, monkeypatch):
+    monkeypatch.setattr(rephrase_prefetch, "REPHRASE_PREFETCH_AHEAD", 2)
+    monkeypatch.setattr(rephrase_prefetch, "translate_text", lambda text, language: f"[{language}] {text}")
+    llm.release()
+    prefetch_upcoming({
+        "language": "french",
+        "current_question_index": 2,
+        "questions": ["Q1", None, "Q3", "Q4"],
+        "original_questions": ["Q1", "Q2", "Q3", "Q4"],
+    })
+
+    deadline = time.monotonic() + 5
+    while rephrase_prefetch._queued and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Q2 was not translated yet, so the prefetch translated it first.
+    assert llm.questions == ["[french] Q2", "Q3"]
@@ -0,0 +1,136 @@
+from io import BytesIO
+from collections import OrderedDict
+from PyPDF2 import PdfReader, PdfWriter
+from metrics import span
+import hashlib
+import os
+import threading
+
+PDF_TEMPLATE_CACHE_SIZE = int(os.environ.get("PDF_TEMPLATE_CACHE_SIZE", 32))
+
+
+def _field_names(annotation):
+    """
+    Names a widget annotation can be addressed by: its own or its parent's
+    partial name (/T) and the fully qualified name built from the /Parent chain.
+    """
+    names = set()
+    parts = []
+    node = annotation
+    while node is not None:
+        if "/T" in node:
+            parts.append(str(node["/T"]))
+        parent = node.get("/Parent")
+        node = parent.get_object() if parent is not None else None
+    if parts:
+        names.add(parts[0])
+        names.add(".".join(reversed(parts)))
+    return names
+
+
+def map_fields_to_pages(reader):
+    """
+    Returns {field name: [page indexes]} for every widget in the document.
+    """
+    field_pages = {}
+    for index, page in enumerate(reader.pages):
+        if "/Annots" not in page:
+            continue
+        for annotation in page["/Annots"]:
+            annotation = annotation.get_object()
+            if annotation.get("/Subtype") != "/Widget":
+                continue
+            for name in _field_names(annotation):
+                pages = field_pages.setdefault(name, [])
+                if index not in pages:
+                    pages.append(index)
+    return field_pages
+
+
+class PdfTemplate:
+    """
+    A blank form parsed once. Each fill still copies every page into a new
+    writer, but from the shared parsed reader rather than a fresh parse, and
+    the field-to-page map means only the pages owning the fields being set
+    are updated.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._reader = PdfReader(BytesIO(data))
+        # The reader loads objects lazily from one stream, so copying pages
+        # out of it is serialised.
+        self._reader_lock = threading.Lock()
+        self.page_count = len(self._reader.pages)
+        self.field_pages = map_fields_to_pages(self._reader)
+        self.widget_pages = sorted({index for pages in self.field_pages.values() for index in pages})
+
+    def _fields_by_page(self, form_data):
+        by_page = {}
+        for name, value in form_data.items():
+            # Fields we could not locate are offered to every page with widgets.
+            for index in self.field_pages.get(name, self.widget_pages):
+                by_page.setdefault(index, {})[name] = value
+        return by_page
+
+    def fill(self, form_data):
+        """
+        Returns the filled PDF as bytes, without touching the disk.
+        """
+        writer = PdfWriter()
+        with self._reader_lock:
+            # add_page clones each page into the writer, so filling never
+            # modifies the shared reader.
+            for page in self._reader.pages:
+                writer.add_page(page)
+
+        for index, page_fields in self._fields_by_page(form_data).items():
+            writer.update_page_form_field_values(writer.pages[index], page_fields)
+
+        output = BytesIO()
+        with span("pdf_write"):
+            writer.write(output)
+        return output.getvalue()
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+def _cached_template(key, load):
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    template = PdfTemplate(load())
+    with _templates_lock:
+        _templates[key] = template
+        while len(_templates) > PDF_TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+    return template
+
+
+def pdf_content_hash(data):
+    # Lives here rather than in pdf_processor so batch fill workers can
+    # use it without importing the LLM client.
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_template(path, pdf_hash=None):
+    """
+    Returns the parsed template for a PDF on disk, cached by content so the
+    same blank form saved under different upload names is parsed once.
+    Passing the content hash, when known, skips reading the file on a hit.
+    """
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+
+    if pdf_hash is None:
+        return template_from_bytes(read())
+    return _cached_template(pdf_hash, read)
+
+
+def template_from_bytes(data):
+    return _cached_template(pdf_content_hash(data), lambda: data)
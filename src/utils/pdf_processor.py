@@ -1,37 +1,53 @@
 from pdfminer.high_level import extract_text
 from io import BytesIO
 from PyPDF2 import PdfReader
+from cache import TieredCache, make_key
+from utils.pdf_filler import pdf_content_hash
+from metrics import span
 from llm_service import send_to_llm  # make sure this import is available
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import re
+
+# Bump when the question extraction prompt changes; cached raw text is kept.
+QUESTION_PROMPT_VERSION = "2"
+
+# Upper bound on characters of form text sent to the LLM in one prompt.
+PDF_CHUNK_CHARS = int(os.environ.get("PDF_CHUNK_CHARS", 6000))
+# Number of chunks whose questions are extracted concurrently.
+PDF_EXTRACTION_WORKERS = int(os.environ.get("PDF_EXTRACTION_WORKERS", 4))
+
+QUESTION_PATTERN = re.compile(r"(Q\d+\s*\|?\s*.*)")
+
+# Blank forms are uploaded over and over, so parsing results are cached by
+# content hash. Raw text and LLM-derived questions are stored separately.
+# Filled-in field values and raw text may be personal data, so they are only
+# kept in memory; field names and questions also go to disk.
+extraction_cache = TieredCache("pdf_extraction")
+
 
 def extract_text_from_pdf(pdf_file):
     try:
         pdf_content = BytesIO(pdf_file.read())
-        return extract_text(pdf_content)
+        with span("pdfminer_extraction"):
+            return extract_text(pdf_content)
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from PDF: {e}")
 
-def extract_form_fields_from_pdf(file):
-    """
-    Try to extract interactive form fields. If none are found,
-    extract the text and use the LLM to determine which lines are questions.
-    Returns a dictionary mapping question texts to their (initially empty) answers.
-    """
-    # Ensure we start reading from the beginning.
-    file.seek(0)
-    reader = PdfReader(file)
-    fields = reader.get_fields()
-    if fields:
-        form_fields = {}
-        for key, field in fields.items():
-            # If a value exists, use it; otherwise, leave it empty.
-            value = field.get("/V", "")
-            form_fields[key] = value
-        if form_fields:
-            return form_fields
+def _read_acroform_fields(data):
+    with span("pdf_parse"):
+        reader = PdfReader(BytesIO(data))
+        fields = reader.get_fields()
+    form_fields = {}
+    for key, field in (fields or {}).items():
+        # If a value exists, use it; otherwise, leave it empty.
+        value = field.get("/V", "")
+        form_fields[key] = value if isinstance(value, str) else str(value)
+    return form_fields
 
-    # Fallback: extract text and ask the LLM to pick out questions.
-    file.seek(0)
-    text = extract_text_from_pdf(file)
+def _llm_questions(text):
     prompt = (
         "Extract only the questions from the following application form text. "
         "Assume that questions are lines starting with a pattern like 'Q1', 'Q2', etc. "
@@ -39,15 +55,121 @@ def extract_form_fields_from_pdf(file):
         f"Text: {text}"
     )
     messages = [{"role": "user", "content": prompt}]
-    response = send_to_llm(messages)
-    import json
-    try:
-        questions = json.loads(response)
-        # Build a dictionary mapping each question to an empty answer.
-        form_fields = {question: "" for question in questions}
-    except Exception as e:
-        # If the LLM output is not proper JSON, fall back to a regex approach.
-        import re
-        question_list = re.findall(r"(Q\d+\s*\|?\s*.*)", text)
-        form_fields = {q.strip(): "" for q in question_list if q.strip()}
-    return form_fields
+    response = send_to_llm(messages, shared=True)
+    questions = json.loads(response)
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        raise ValueError(f"Expected a JSON array of strings, got: {response}")
+    return questions
+
+def _regex_questions(text):
+    return [q.strip() for q in QUESTION_PATTERN.findall(text) if q.strip()]
+
+def chunk_text(text, max_chars=PDF_CHUNK_CHARS):
+    """
+    Split extracted text into chunks of whole pages (pdfminer separates pages
+    with form feeds) of at most max_chars. Pages longer than that are split
+    on line boundaries.
+    """
+    pieces = []
+    for page in text.split("\f"):
+        if len(page) <= max_chars:
+            pieces.append(page)
+            continue
+        current = ""
+        for line in page.splitlines(keepends=True):
+            if current and len(current) + len(line) > max_chars:
+                pieces.append(current)
+                current = ""
+            current += line
+        pieces.append(current)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\f{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def merge_questions(question_lists):
+    """
+    Concatenate per-chunk results in document order, dropping repeats such
+    as headers that appear on every page.
+    """
+    merged = []
+    seen = set()
+    for questions in question_lists:
+        for question in questions:
+            key = " ".join(question.split()).lower()
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(question.strip())
+    return merged
+
+def _questions_from_text(text):
+    """
+    Work out which lines of the text are questions. Returns (questions,
+    cacheable); results where an LLM call failed are not cached so a later
+    upload can retry.
+    """
+    # Numbered questions can be found without the LLM at all.
+    questions = _regex_questions(text)
+    if questions:
+        return merge_questions([questions]), True
+
+    chunks = chunk_text(text)
+    if not chunks:
+        return [], True
+
+    def extract_chunk(chunk):
+        try:
+            return _llm_questions(chunk), True
+        except Exception as e:
+            # The regex already found nothing, so a failed chunk contributes no questions.
+            logging.warning(f"LLM question extraction failed for a chunk: {e}")
+            return [], False
+
+    with span("question_extraction"), ThreadPoolExecutor(max_workers=min(PDF_EXTRACTION_WORKERS, len(chunks))) as executor:
+        results = list(executor.map(extract_chunk, chunks))
+    return merge_questions(questions for questions, _ in results), all(ok for _, ok in results)
+
+def extract_form_fields_from_pdf(file):
+    """
+    Try to extract interactive form fields. If none are found, extract the
+    text and take its numbered question lines; only if there are none is
+    the LLM asked to pick out the questions, chunk by chunk in parallel.
+    Results are cached by the PDF's content hash.
+    Returns a dictionary mapping question texts to their (initially empty) answers.
+    """
+    # Ensure we start reading from the beginning.
+    file.seek(0)
+    data = file.read()
+    digest = pdf_content_hash(data)
+
+    fields_key = make_key("fields", digest)
+    form_fields = extraction_cache.get(fields_key)
+    if form_fields is None:
+        form_fields = _read_acroform_fields(data)
+        # An empty dict is cached too: it records that the form has no fields.
+        extraction_cache.set(fields_key, form_fields, persist=not any(form_fields.values()))
+    if form_fields:
+        return dict(form_fields)
+
+    # Fallback: extract text and ask the LLM to pick out questions.
+    questions_key = make_key("questions", digest, QUESTION_PROMPT_VERSION)
+    questions = extraction_cache.get(questions_key)
+    if questions is None:
+        text_key = make_key("text", digest)
+        text = extraction_cache.get(text_key)
+        if text is None:
+            text = extract_text_from_pdf(BytesIO(data))
+            extraction_cache.set(text_key, text, persist=False)
+        questions, cacheable = _questions_from_text(text)
+        if cacheable:
+            extraction_cache.set(questions_key, questions)
+
+    # Build a dictionary mapping each question to an empty answer.
+    return {question: "" for question in questions}